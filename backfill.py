@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Backfill a JSONL event file through the streaming pipeline.
+
+Reads the file from its checkpoint to EOF at disk speed (parsing chunks in a
+process pool with --workers), runs the batches through run_streaming() and
+advances the checkpoint only past events that have been processed, so an
+interrupted or failed backfill resumes where it left off.
+"""
+import argparse
+import asyncio
+
+import fastAPI  # noqa: F401  (initialises the package import order used by the agents)
+from team_agents.agents.lib.config import get_config
+from team_agents.agents.lib.file_source import JsonlFileSource
+from team_agents.core.graph import _pretty_print_results
+from team_agents.core.streaming import run_backfill
+from team_agents.tools.elastic_esql import close_async_client
+
+
+def _args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help="JSONL file to backfill")
+    parser.add_argument("--checkpoint", default=None, help="offset checkpoint file (default: <path>.offset)")
+    parser.add_argument("--workers", type=int, default=int(get_config("collector.file_workers", 0)),
+                        help="parser processes (0 parses on the event loop's executor)")
+    parser.add_argument("--chunk-bytes", type=int, default=int(get_config("collector.file_chunk_bytes", 4194304)))
+    parser.add_argument("--final", action="store_true",
+                        help="the file is complete: also process an unterminated last line")
+    return parser.parse_args()
+
+
+async def _main(args: argparse.Namespace) -> None:
+    source = JsonlFileSource(
+        args.path,
+        checkpoint_path=args.checkpoint,
+        chunk_bytes=args.chunk_bytes,
+        workers=args.workers,
+    )
+    try:
+        _pretty_print_results(await run_backfill(source, final=args.final))
+    finally:
+        await close_async_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(_args()))
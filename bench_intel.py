@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for CTI enrichment lookups.
+
+Builds indicator indexes of increasing size and measures the per-event lookup
+cost; with the compiled index it should stay flat as the feed grows.
+"""
+import random
+import time
+
+import fastAPI  # noqa: F401  (initialises the package import order used by the agents)
+from team_agents.agents.lib.indicator_index import IndicatorIndex
+
+SIZES = (1_000, 10_000, 100_000)
+EVENTS = 2_000
+
+
+def _events(n: int):
+    rnd = random.Random(7)
+    return [
+        {
+            "host": f"10.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}",
+            "meta": {"ip": f"192.168.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}", "proc": "svchost.exe"},
+        }
+        for _ in range(n)
+    ]
+
+
+def bench_index():
+    sample = _events(EVENTS)
+    for n in SIZES:
+        feed = [{"id": str(i), "type": "domain", "attributes": {"value": f"bad-{i}.example.net"}} for i in range(n)]
+        # a quarter of the feed carries CIDR blocks outside the sampled address space
+        feed += [{"id": f"net{i}", "type": "cidr", "attributes": {"value": f"172.{i % 16 + 16}.{i // 16 % 256}.0/24"}}
+                 for i in range(n // 4)]
+        t0 = time.perf_counter()
+        index = IndicatorIndex(feed)
+        built = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for evt in sample:
+            (index.exact(evt["host"], evt["meta"]["ip"])
+             or index.network(evt["host"], evt["meta"]["ip"])
+             or index.fuzzy(evt["host"], str(evt["meta"])))
+        per_event = (time.perf_counter() - t0) / EVENTS
+        print(f"indicators={n:>7}  build={built:7.3f}s  per_event={per_event * 1e6:8.1f}us")
+
+
+if __name__ == "__main__":
+    bench_index()
@@ -22,12 +22,15 @@ __all__ = [
     "get_config",
     "safe_ask_llm",
     "embedder",
+    "embed_many",
     "fetch_feed",
+    "fetch_feed_delta",
     "run_query",
     "perform_action",
     # graph
     "hunt_graph",
     "HuntState",
+    "run_streaming",
     # app
     "fastapi_app",
 ]
@@ -65,7 +68,9 @@ to_json_safe = _LazyAttr("fastAPI.utils", "to_json_safe")
 get_config = _LazyAttr("fastAPI.utils", "get_config")
 safe_ask_llm = _LazyAttr("fastAPI.utils", "safe_ask_llm")
 embedder = _LazyAttr("fastAPI.utils", "embedder")
+embed_many = _LazyAttr("fastAPI.utils", "embed_many")
 fetch_feed = _LazyAttr("fastAPI.utils", "fetch_feed")
+fetch_feed_delta = _LazyAttr("fastAPI.utils", "fetch_feed_delta")
 run_query = _LazyAttr("fastAPI.utils", "run_query")
 perform_action = _LazyAttr("fastAPI.utils", "perform_action")
 
@@ -74,3 +79,4 @@ perform_action = _LazyAttr("fastAPI.utils", "perform_action")
 # ----------------------
 hunt_graph = _LazyAttr("team_agents.core.graph", "hunt_graph")
 HuntState = _LazyAttr("team_agents.core.graph", "HuntState")
+run_streaming = _LazyAttr("team_agents.core.streaming", "run_streaming")
@@ -4,24 +4,45 @@ FastAPI fastAPI exposing endpoints to run the SecOps hunt pipeline.
 
 Endpoints:
  - POST /run   -> run a hunt with provided messages (list of {"event": ...})
+ - WS   /ingest/ws -> continuous telemetry ingest with credit-based backpressure
+ - GET  /metrics -> pipeline metrics and live ingest connections
  - GET  /ping  -> simple health check
  - GET  /demo  -> infinite stream of demo_ai cases
 """
 from __future__ import annotations
 
+import json
 import logging
 import random
 import asyncio
-from typing import Any, Dict, List
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 
+from team_agents.agents.lib.alerts import dumps
+from team_agents.agents.lib.config import get_config
+from team_agents.agents.lib.event_batch import parse_ndjson
+from team_agents.agents.lib.utils import metrics
 from team_agents.core.graph import hunt_graph, HuntState
+from team_agents.core.streaming import run_streaming
+from team_agents.tools.elastic_esql import close_async_client
 
 logger = logging.getLogger("team_agents.api")
-app = FastAPI(title="SecOps Graph API", version="0.1.0")
+
+
+@asynccontextmanager
+async def _lifespan(_: FastAPI) -> AsyncIterator[None]:
+    yield
+    # the detector's pooled Elasticsearch client lives on the server loop
+    await close_async_client()
+
+
+app = FastAPI(title="SecOps Graph API", version="0.1.0", lifespan=_lifespan)
 
 class RunRequest(BaseModel):
     messages: List[Dict[str, Any]] = []
@@ -39,16 +60,201 @@ def run_hunt(req: RunRequest):
     """
     Invoke the compiled LangGraph pipeline synchronously using the
     supplied messages as initial state. Returns alerts and story.
+
+    Alert records are encoded straight to JSON here (RunResponse only
+    documents the shape), instead of being validated into models first.
     """
     try:
         state = HuntState(messages=req.messages)
         result = hunt_graph.invoke(state)
-        return RunResponse(alerts=result.alerts or [], story=result.story)
+        body = dumps({"alerts": result.alerts or [], "story": result.story})
+        return Response(content=body, media_type="application/json")
     except Exception as exc:
         logger.exception("Hunt run failed: %s", exc)
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@app.get("/metrics")
+def get_metrics() -> Dict[str, Any]:
+    snap = metrics.snapshot()
+    snap["ingest_connections"] = {cid: conn.stats() for cid, conn in _ws_connections.items()}
+    return snap
+
+
+# --- WebSocket telemetry ingest ---
+#
+# Protocol (JSON text frames from the server):
+#   server -> {"type": "credit", "credits": n}   on connect and as micro-batches finish processing
+#   client -> event frames: a JSON object, a JSON array, or NDJSON (text or binary)
+#   client -> {"type": "end"}                     finish; server replies with the hunt result
+#   server -> {"type": "result", "alerts": [...], "story": {...}} then closes
+# A client may only send as many events as it holds credits for; a frame that
+# overdraws is rejected with {"type": "error"} and the connection is closed (1008).
+# If the hunt itself fails, the server sends {"type": "error"} and closes (1011).
+
+_EOF = object()
+_ws_connections: Dict[str, "_IngestConnection"] = {}
+
+
+class _IngestConnection:
+    def __init__(self, ws: WebSocket, credits: int) -> None:
+        self.id = uuid.uuid4().hex[:8]
+        self.ws = ws
+        self.window = credits
+        self.credits = credits  # events the client may still send
+        self.queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=credits + 1)
+        self.started = time.time()
+        self.frames = 0
+        self.events = 0
+        self.processed = 0
+        self.bytes = 0
+        self.queue_depth_max = 0
+        self._unacked = 0
+        self._send_lock = asyncio.Lock()
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = max(time.time() - self.started, 1e-9)
+        return {
+            "frames": self.frames,
+            "events": self.events,
+            "bytes": self.bytes,
+            "queue_depth": self.queue.qsize(),
+            "queue_depth_max": self.queue_depth_max,
+            "in_flight": self.events - self.processed,
+            "credits": self.credits,
+            "events_per_second": self.events / elapsed,
+            "connected_seconds": elapsed,
+        }
+
+    async def send(self, payload: Dict[str, Any]) -> None:
+        async with self._send_lock:
+            await self.ws.send_text(dumps(payload).decode("utf-8"))
+
+    async def events_iter(self) -> AsyncIterator[Any]:
+        """Drain the queue for run_streaming()."""
+        while True:
+            evt = await self.queue.get()
+            if evt is _EOF:
+                return
+            yield evt
+
+    async def batch_done(self, seq: int, count: int, ok: bool) -> None:
+        """
+        run_streaming() callback: `count` events have left the pipeline (processed
+        or failed, in any batch order), so their credits go back to the client,
+        in chunks of a quarter window (or all at once when nothing accepted is
+        still being held).
+        """
+        self.processed += count
+        self._unacked += count
+        if self._unacked < max(1, self.window // 4) and self.processed < self.events:
+            return
+        granted, self._unacked = self._unacked, 0
+        self.credits += granted
+        try:
+            await self.send({"type": "credit", "credits": granted})
+        except Exception:
+            pass  # client gone; the reader loop handles shutdown
+
+    async def fail(self, exc: BaseException) -> None:
+        """Report a failed hunt to the client and close with 1011 (internal error)."""
+        logger.error("Ingest connection %s: hunt failed: %s", self.id, exc)
+        metrics.incr("ingest.ws_errors", 1)
+        try:
+            await self.send({"type": "error", "reason": f"hunt failed: {exc}"})
+            await self.ws.close(code=1011)
+        except Exception:
+            pass  # client already gone
+
+
+def _decode_frame(message: Dict[str, Any]) -> Any:
+    """Events from one frame, or the control message dict {"type": ...}."""
+    raw = message.get("bytes")
+    if raw is not None:
+        return parse_ndjson(raw)
+    text = message.get("text") or ""
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        return parse_ndjson(text)  # multi-line NDJSON batch
+    if isinstance(payload, list):
+        return payload
+    if isinstance(payload, dict) and payload.get("type") in ("end",):
+        return payload
+    return [payload]
+
+
+@app.websocket("/ingest/ws")
+async def ingest_ws(ws: WebSocket):
+    """
+    Continuous telemetry ingest. Events are fed through a bounded queue into
+    run_streaming(); credits are returned only once a micro-batch has been
+    processed, so the server never holds more than ingest.ws_credits events
+    per connection (queued, batching or in flight).
+    """
+    await ws.accept()
+    conn = _IngestConnection(ws, credits=int(get_config("ingest.ws_credits") or 1000))
+    _ws_connections[conn.id] = conn
+    metrics.incr("ingest.ws_connections", 1)
+    hunt = asyncio.create_task(run_streaming(conn.events_iter(), on_batch_done=conn.batch_done))
+    try:
+        await conn.send({"type": "credit", "credits": conn.credits, "connection": conn.id})
+        while True:
+            receiver = asyncio.ensure_future(ws.receive())
+            await asyncio.wait({receiver, hunt}, return_when=asyncio.FIRST_COMPLETED)
+            if hunt.done():
+                # the hunt only finishes after "end": anything earlier is a failure
+                receiver.cancel()
+                exc = None if hunt.cancelled() else hunt.exception()
+                await conn.fail(exc or RuntimeError("streaming stopped early"))
+                return
+            message = receiver.result()
+            if message.get("type") == "websocket.disconnect":
+                break
+            decoded = _decode_frame(message)
+            if isinstance(decoded, dict):  # {"type": "end"}
+                await conn.queue.put(_EOF)
+                try:
+                    result = await hunt
+                except Exception as exc:
+                    await conn.fail(exc)
+                    return
+                await conn.send({"type": "result", "alerts": result.alerts or [], "story": result.story})
+                await ws.close()
+                return
+            conn.frames += 1
+            conn.bytes += len(message.get("bytes") or message.get("text") or "")
+            if len(decoded) > conn.credits:
+                metrics.incr("ingest.ws_credit_violations", 1)
+                await conn.send({"type": "error", "reason": "credit exceeded",
+                                 "credits": conn.credits, "events": len(decoded)})
+                await ws.close(code=1008)
+                return
+            conn.credits -= len(decoded)
+            for evt in decoded:
+                conn.queue.put_nowait(evt)  # never blocks: credits bound the queue
+            conn.events += len(decoded)
+            conn.queue_depth_max = max(conn.queue_depth_max, conn.queue.qsize())
+            metrics.incr("ingest.ws_frames", 1)
+            metrics.incr("ingest.ws_events", len(decoded))
+    except WebSocketDisconnect:
+        pass
+    except Exception as exc:
+        logger.exception("Ingest connection %s failed: %s", conn.id, exc)
+        metrics.incr("ingest.ws_errors", 1)
+    finally:
+        _ws_connections.pop(conn.id, None)
+        if not hunt.done():
+            # flush what was already accepted through the pipeline, without a client to answer
+            conn.queue.put_nowait(_EOF)
+            try:
+                await hunt
+            except Exception as exc:
+                logger.warning("Ingest connection %s: final hunt failed: %s", conn.id, exc)
+        metrics.timing("ingest.ws_connection_seconds", time.time() - conn.started)
+        logger.info("Ingest connection %s closed: %s", conn.id, conn.stats())
+
+
 # --- Demo AI streaming ---
 COLLECTOR_OUTCOMES = [
     "Normalized 2 SMB events from workstation-12",
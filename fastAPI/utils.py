@@ -10,8 +10,8 @@ from __future__ import annotations
 
 from team_agents.agents.lib.utils import cache, metrics, safe_get, to_json_safe
 from team_agents.agents.lib.config import get_config
-from team_agents.core.llm import safe_ask_llm, embedder
-from team_agents.tools.cti_feed import fetch_feed
+from team_agents.core.llm import safe_ask_llm, embedder, embed_many, embed_many_tagged, embedding_model
+from team_agents.tools.cti_feed import fetch_feed, fetch_feed_delta
 from team_agents.tools.elastic_esql import run_query
 from team_agents.tools.soar_actions import perform_action
 
@@ -23,7 +23,11 @@ __all__ = [
     "get_config",
     "safe_ask_llm",
     "embedder",
+    "embed_many",
+    "embed_many_tagged",
+    "embedding_model",
     "fetch_feed",
+    "fetch_feed_delta",
     "run_query",
     "perform_action",
 ]
@@ -3,48 +3,70 @@ a_collector.py — Expanded async collector with multiple source adapters and re
 
 Features:
  - Async fetching from configured sources (HTTP, file, synthetic generator)
- - Input validation, normalization, deduplication (TTL cache)
+ - JSONL file source (collector.file_source_path): mmap'd, read batch_size lines per
+   run from a persisted byte offset, so backfills resume where they stopped; the
+   offset is committed only after the batch was processed, and concurrent hunts
+   take the source's lock so each slice is read and committed by one of them
+   (backfill.py streams a whole file through run_streaming() instead)
+ - Input validation, columnar batch normalization (EventBatch)
+ - Deduplication in a fixed-memory, time-sliced Bloom filter (RotatingBloomFilter)
+ - Accepts raw dicts or NDJSON bytes as input messages
  - Extensible enrichment hooks and basic rate-limiting
+ - LLM enrichment as a separate stage: one call per distinct payload shape,
+   bounded by collector.enrich_concurrency
  - Emits timing/metrics to team_agents.team_agents.utils.metrics
 """
 from __future__ import annotations
 
 import asyncio
-import hashlib
-import itertools
 import logging
+import threading
 import time
-from typing import Any, Dict, Iterable, List
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
 
 from langgraph.types import Command
 from langgraph.graph import END
 
-from fastAPI.utils import cache, metrics, safe_get, to_json_safe
+from fastAPI.utils import metrics, to_json_safe
 from fastAPI.utils import get_config
 from fastAPI.utils import safe_ask_llm
+from team_agents.agents.lib.dedup import RotatingBloomFilter
+from team_agents.agents.lib.event_batch import EventBatch, normalize_batch, parse_ndjson
+from team_agents.agents.lib.file_source import JsonlFileSource
 
 logger = logging.getLogger(__name__)
 
+_dedup: Optional[RotatingBloomFilter] = None
+_file_sources: Dict[str, JsonlFileSource] = {}
+_file_sources_lock = threading.Lock()
+
+def _dedup_filter() -> RotatingBloomFilter:
+    global _dedup
+    if _dedup is None:
+        _dedup = RotatingBloomFilter(
+            window_seconds=float(get_config("collector.dedup_window_seconds") or 60),
+            capacity=int(get_config("collector.dedup_capacity") or 200_000),
+            fp_rate=float(get_config("collector.dedup_fp_rate") or 0.001),
+            slices=int(get_config("collector.dedup_slices") or 4),
+        )
+    return _dedup
+
 # -----------------------
 # Helpers
 # -----------------------
-def _normalize_message(raw: Dict[str, Any]) -> Dict[str, Any]:
-    ts = raw.get("ts") or raw.get("timestamp") or time.time()
-    event = raw.get("event") or raw.get("type") or "unknown"
-    source = raw.get("source") or raw.get("origin") or "ingest"
-    host = raw.get("host") or safe_get(raw, "meta", {}).get("host")
-    user = raw.get("user") or safe_get(raw, "meta", {}).get("user")
-    meta = safe_get(raw, "meta", {}) or {}
-    fingerprint = hashlib.sha256(f"{event}|{host}|{user}|{ts}".encode()).hexdigest()
-    return {"id": fingerprint, "ts": float(ts), "event": event, "source": source, "host": host, "user": user, "meta": meta}
-
-def _chunk(iterable: Iterable, size: int):
-    it = iter(iterable)
-    while True:
-        batch = list(itertools.islice(it, size))
-        if not batch:
-            break
-        yield batch
+def _file_source(path: str) -> JsonlFileSource:
+    with _file_sources_lock:
+        source = _file_sources.get(path)
+        if source is None:
+            source = JsonlFileSource(
+                path,
+                checkpoint_path=get_config("collector.file_checkpoint_path") or None,
+                chunk_bytes=int(get_config("collector.file_chunk_bytes") or 4 << 20),
+            )
+            _file_sources[path] = source
+        return source
 
 async def _simulate_http_fetch(url: str) -> List[Dict[str, Any]]:
     # small simulated HTTP fetch to avoid network calls in tests
@@ -54,22 +76,68 @@ async def _simulate_http_fetch(url: str) -> List[Dict[str, Any]]:
 # -----------------------
 # Collector Node
 # -----------------------
-async def _apply_enrichment(evt: Dict[str, Any]) -> Dict[str, Any]:
+def _payload_shape(batch: EventBatch, i: int) -> Tuple[Any, ...]:
+    """Template key for an event: type, source and the meta fields it carries (not their values)."""
+    return (batch.event[i], batch.source[i], batch.host[i] is not None,
+            batch.user[i] is not None, tuple(sorted(str(k) for k in batch.meta[i])))
+
+async def _describe_payload(evt: Dict[str, Any], sem: asyncio.Semaphore) -> Any:
     """
     Example enrichment that uses the LLM to infer a short note for ambiguous events.
     Runs quickly – uses safe_ask_llm which may be simulated if no key present.
     """
-    try:
-        if evt.get("event") == "unknown":
+    async with sem:
+        try:
             prompt = f"Shortly describe what a suspicious event might be for payload: {to_json_safe(evt)[:400]}"
             resp = await safe_ask_llm(prompt, max_tokens=64)
-            evt["llm_note"] = resp.get("text")
             metrics.incr("collector.llm_enrichments", 1)
-    except Exception:
-        metrics.incr("collector.enrich_errors", 1)
-    return evt
+            return resp.get("text")
+        except Exception:
+            metrics.incr("collector.enrich_errors", 1)
+            return None
+
+async def _apply_enrichment(batch: EventBatch) -> EventBatch:
+    """
+    Enrichment stage, run once over the normalized batch.
+
+    Ambiguous ('unknown') events are grouped by payload shape; each group gets a
+    single LLM call (on its first event) and the note is copied to every member.
+    Calls for different shapes run concurrently, at most collector.enrich_concurrency
+    at a time.
+    """
+    groups: Dict[Tuple[Any, ...], List[int]] = {}
+    for i, event in enumerate(batch.event):
+        if event == "unknown":
+            groups.setdefault(_payload_shape(batch, i), []).append(i)
+    if not groups:
+        return batch
+    start = time.time()
+    sem = asyncio.Semaphore(max(1, int(get_config("collector.enrich_concurrency") or 8)))
+    members = list(groups.values())
+    notes = await asyncio.gather(*(_describe_payload(batch[group[0]], sem) for group in members))
+    for group, note in zip(members, notes):
+        if note is None:
+            continue
+        for i in group:
+            batch.annotate(i, "llm_note", note)
+    deduped = sum(len(group) for group in members) - len(members)
+    metrics.incr("collector.enrich_deduplicated", deduped)
+    metrics.timing("collector.enrich_seconds", time.time() - start)
+    return batch
 
 async def collector_agent(state: "object") -> Command:  # type: ignore[name-defined]
+    file_path = get_config("collector.file_source_path")
+    if not file_path:
+        return await _collect(state, None)
+    source = _file_source(str(file_path))
+    # hunts may run on different threads and loops; wait for the source without blocking this loop
+    await asyncio.get_running_loop().run_in_executor(None, source.lock.acquire)
+    try:
+        return await _collect(state, source)
+    finally:
+        source.lock.release()
+
+async def _collect(state: "object", file_source: Optional[JsonlFileSource]) -> Command:  # type: ignore[name-defined]
     start = time.time()
     batch_size = int(get_config("collector.batch_size") or 500)
     max_retries = int(get_config("collector.max_retries") or 3)
@@ -78,10 +146,16 @@ async def collector_agent(state: "object") -> Command:  # type: ignore[name-defi
     logger.info("Collector starting with %d input messages", len(input_messages))
     metrics.incr("collector.invocations", 1)
 
-    normalized: List[Dict[str, Any]] = []
+    normalized = EventBatch.empty()
+    fingerprint = str(get_config("collector.fingerprint") or "sha256")
 
-    # Simulate reading from configured sources (some may be URLs)
-    sources = [m for m in input_messages]
+    # Simulate reading from configured sources (some may be URLs); NDJSON payloads are expanded
+    sources: List[Any] = []
+    for m in input_messages:
+        if isinstance(m, (bytes, bytearray)):
+            sources.extend(parse_ndjson(bytes(m)))
+        else:
+            sources.append(m)
     # Also support configuration-driven pulls (e.g., CTI endpoints)
     extra_source = get_config("collector.extra_source_url")
     if extra_source:
@@ -91,25 +165,31 @@ async def collector_agent(state: "object") -> Command:  # type: ignore[name-defi
             metrics.incr("collector.remote_fetches", 1)
         except Exception as exc:
             logger.warning("Failed to fetch extra source: %s", exc)
+    file_end: Optional[int] = None
+    if file_source is not None:
+        try:
+            # next slice of the file; parsing is blocking IO, keep it off the event loop
+            loop = asyncio.get_running_loop()
+            read, file_end = await loop.run_in_executor(None, file_source.read_batch, batch_size)
+            sources.extend(read)
+            metrics.incr("collector.file_events", len(read))
+        except Exception as exc:
+            logger.warning("Failed to read file source %s: %s", file_source.path, exc)
 
     # Basic retry for normalization step
     for attempt in range(1, max_retries + 1):
         try:
-            for raw in sources:
-                try:
-                    norm = _normalize_message(raw)
-                    key = f"evt:{norm['id']}"
-                    if cache.get(key):
-                        metrics.incr("collector.duplicates", 1)
-                        continue
-                    cache.set(key, True, ttl=60)
-                    # enrich where applicable
-                    enriched = await _apply_enrichment(norm)
-                    normalized.append(enriched)
-                    metrics.incr("collector.normalized", 1)
-                except Exception as e:
-                    metrics.incr("collector.normalize_errors", 1)
-                    logger.debug("Skipping malformed raw: %s (%s)", raw, e)
+            batch = normalize_batch(sources, fingerprint=fingerprint)
+            if len(batch) < len(sources):
+                metrics.incr("collector.normalize_errors", len(sources) - len(batch))
+            dedup = _dedup_filter()
+            seen = dedup.seen_many(batch.id)
+            duplicates = int(seen.sum())
+            normalized = batch.take(np.flatnonzero(~seen).tolist()) if duplicates else batch
+            metrics.incr("collector.duplicates", duplicates)
+            metrics.incr("collector.normalized", len(normalized))
+            metrics.gauge("collector.dedup_ratio", dedup.dedup_ratio)
+            metrics.gauge("collector.dedup_memory_bytes", dedup.memory_bytes)
             break
         except Exception as exc:
             logger.exception("Collector normalization attempt %d failed: %s", attempt, exc)
@@ -118,20 +198,26 @@ async def collector_agent(state: "object") -> Command:  # type: ignore[name-defi
                 logger.info("collector error, moving to end")
                 return Command(goto=END)
 
-    # batch and persist
-    batched: List[Dict[str, Any]] = []
-    for chunk in _chunk(normalized, batch_size):
-        batched.extend(chunk)
+    # enrich where applicable, once for the whole batch
+    normalized = await _apply_enrichment(normalized)
 
+    # persist the columnar batch; downstream agents iterate it (rows are built lazily) or read columns
     try:
-        state.evidence["raw"] = batched
+        state.evidence["raw"] = normalized
         elapsed = time.time() - start
         metrics.timing("collector.duration_seconds", elapsed)
-        logger.info("Collector stored %d normalized events (duration=%.3fs)", len(batched), elapsed)
+        logger.info("Collector stored %d normalized events (duration=%.3fs)", len(normalized), elapsed)
     except Exception as exc:
         logger.exception("Failed to persist collector evidence: %s", exc)
         logger.info("Collector persist error, moving to end")
         return Command(goto=END)
 
+    # the slice is processed: only now move the file offset past it (a failed run re-reads it)
+    if file_source is not None and file_end is not None and file_end != file_source.offset:
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, file_source.commit, file_end)
+        except Exception as exc:
+            logger.warning("Failed to commit file source offset for %s: %s", file_source.path, exc)
+
     logger.info("Collected raw events, moving to intel_agent")
     return Command(goto="intel_agent")
@@ -2,8 +2,12 @@
 b_intel.py — Expanded async CTI enrichment.
 
 Features:
- - Cached CTI feed with TTL using team_agents.utils.SimpleCache
- - Fast approximate matching using substring checks and naive embedding similarity
+ - CTI feed served stale-while-revalidate by a background, single-flight FeedManager
+ - Feed compiled once per refresh into an IndicatorIndex (exact dict + Aho-Corasick + CIDR trie)
+ - Feed + index persisted to an mmap'd snapshot so new workers start warm
+ - Fast approximate matching using substring checks and embedding similarity
+ - Optional semantic pass: unmatched events are scored against the whole feed in one
+   matrix product (EmbeddingMatrix.top_k)
  - Optional LLM-assisted enrichment for high-risk hits
  - Stores enriched events under state.evidence['enriched']
 """
@@ -11,75 +15,131 @@ from __future__ import annotations
 
 import asyncio
 import logging
-import math
 import time
-from typing import Any, Dict, List, Sequence
+from typing import Any, Dict, List, Optional, Tuple
 
 from langgraph.types import Command
 
-from fastAPI.utils import cache, metrics, to_json_safe
+from fastAPI.utils import metrics, to_json_safe
 from fastAPI.utils import get_config
-from fastAPI.utils import embedder, safe_ask_llm
-from fastAPI.utils import fetch_feed  # uses existing tools module
+from fastAPI.utils import embed_many, embed_many_tagged, embedding_model, safe_ask_llm
+from fastAPI.utils import fetch_feed_delta  # uses existing tools module
+from team_agents.agents.lib.feed_manager import FeedManager, FeedSnapshot
+from team_agents.agents.lib.indicator_index import IndicatorIndex
+from team_agents.agents.lib.similarity import EmbeddingMatrix, cosine
 
 logger = logging.getLogger(__name__)
 
-def _approx_similarity(a: list[float], b: list[float]) -> float:
-    # cosine-like approximation for demo
-    if not a or not b:
-        return 0.0
-    num = sum(x * y for x, y in zip(a, b))
-    denom = math.sqrt(sum(x * x for x in a) * sum(y * y for y in b))
-    return num / denom if denom else 0.0
+# feed is refreshed in the background; the hot path only reads the last good snapshot
+feed_manager = FeedManager(fetch_feed_delta)
 
-async def _cached_feed(ttl: int = 300) -> List[Dict[str, Any]]:
-    cached = cache.get("cti_feed")
-    now = time.time()
-    if cached and cache.get("cti_feed_ts") and now - cache.get("cti_feed_ts", 0) < ttl:
-        return cached
-    # fetch (sync function wrapped in threadpool)
-    loop = asyncio.get_event_loop()
-    raw = await loop.run_in_executor(None, fetch_feed)
-    # simple normalisation of items to dicts (pydantic objects may be returned)
-    items: List[Dict[str, Any]] = []
-    for it in raw:
-        try:
-            items.append(it.dict() if hasattr(it, "dict") else dict(it))
-        except Exception:
+# feed embeddings for the semantic pass, rebuilt when the snapshot's items change
+# (items list, embedding model, matrix); holding the list itself keeps identity checks
+# sound across refreshes. Only matrices from the primary model are kept: fallback
+# vectors (embedding outage) live in another space and are rebuilt on every pass.
+_feed_matrix: Optional[Tuple[List[Dict[str, Any]], str, EmbeddingMatrix]] = None
+
+def _event_text(evt: Dict[str, Any]) -> str:
+    return str(evt.get("host") or evt.get("meta", {}))
+
+def _indicator_text(item: Dict[str, Any]) -> str:
+    return str((item.get("attributes") or {}).get("value", ""))
+
+async def _current_snapshot() -> FeedSnapshot:
+    feed_manager.configure(
+        ttl=int(get_config("intel.cache_ttl_seconds") or 300),
+        refresh_ahead=float(get_config("intel.refresh_ahead_ratio") or 0.8),
+        retry_seconds=float(get_config("intel.feed_retry_seconds") or 30),
+        snapshot_path=str(get_config("intel.snapshot_path") or ""),
+    )
+    return await feed_manager.get()
+
+async def _feed_embeddings(snapshot: FeedSnapshot, model: str) -> Optional[EmbeddingMatrix]:
+    """Feed matrix in the embedding space of `model`, or None when it cannot be built there."""
+    global _feed_matrix
+    items = snapshot.items
+    if not items:
+        return None
+    cached = _feed_matrix
+    if cached is not None and cached[0] is items and cached[1] == model:
+        return cached[2]
+    started = time.time()
+    texts = [_indicator_text(item) for item in items]
+    loop = asyncio.get_running_loop()
+    # embedding + stacking the whole feed is blocking work; keep it off the event loop
+    vectors, built_with = await loop.run_in_executor(None, embed_many_tagged, texts)
+    if built_with != model:
+        # the engine changed between the query and feed embeddings; scores would be meaningless
+        metrics.incr("intel.semantic_model_mismatch", 1)
+        return None
+    matrix = await loop.run_in_executor(None, EmbeddingMatrix, vectors, list(range(len(items))))
+    if built_with == embedding_model():
+        _feed_matrix = (items, built_with, matrix)
+    metrics.timing("intel.feed_embed_seconds", time.time() - started)
+    return matrix
+
+async def _semantic_pass(enriched: List[Dict[str, Any]], snapshot: FeedSnapshot) -> None:
+    """Match still-unmatched events against every indicator by embedding similarity."""
+    pending = [i for i, evt in enumerate(enriched) if not evt.get("indicator_match")]
+    if not pending or not snapshot.items:
+        return
+    threshold = float(get_config("intel.semantic_threshold") or 0.85)
+    texts = [_event_text(enriched[i]) for i in pending]
+    queries, model = await asyncio.get_running_loop().run_in_executor(None, embed_many_tagged, texts)
+    # the feed side must come from the same model as the queries
+    matrix = await _feed_embeddings(snapshot, model)
+    if matrix is None:
+        return
+    for i, hits in zip(pending, matrix.top_k(queries, k=1, min_score=threshold)):
+        if not hits:
             continue
-    cache.set("cti_feed", items, ttl=ttl)
-    cache.set("cti_feed_ts", now, ttl=ttl)
-    metrics.incr("intel.feed_refreshed", 1)
-    return items
+        pos, score = hits[0]
+        evt = dict(enriched[i])
+        evt["indicator_match"] = True
+        evt["indicator"] = snapshot.items[pos]
+        evt["indicator_confidence"] = score
+        enriched[i] = evt
+        metrics.incr("intel.hits_semantic", 1)
 
-async def _enrich_event(evt: Dict[str, Any], feed: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+async def _enrich_event(evt: Dict[str, Any], index: IndicatorIndex) -> Dict[str, Any]:
+    meta = evt.get("meta") or {}
     # quick exact match
-    for item in feed:
-        if item.get("attributes", {}).get("value") and (item["attributes"]["value"] == evt.get("host") or item["attributes"]["value"] == evt.get("meta", {}).get("ip")):
-            # annotate with CTI item and compute confidence via embedding similarity
-            evt = dict(evt)
-            evt["indicator_match"] = True
-            evt["indicator"] = item
-            base_emb = embedder(str(evt.get("host") or evt.get("meta", {})))
-            item_emb = embedder(str(item.get("attributes", {}).get("value", "")))
-            evt["indicator_confidence"] = _approx_similarity(base_emb, item_emb)
-            metrics.incr("intel.hits_exact", 1)
-            # optionally, ask the LLM for a short rationale for high-confidence matches
-            if evt["indicator_confidence"] > 0.5:
-                prompt = f"Provide a one-line rationale for why this event matches CTI: event={to_json_safe(evt)[:300]}"
-                resp = await safe_ask_llm(prompt, max_tokens=80)
-                evt["indicator_rationale"] = resp.get("text")
-            return evt
+    item = index.exact(evt.get("host"), meta.get("ip"))
+    if item is not None:
+        # annotate with CTI item and compute confidence via embedding similarity
+        evt = dict(evt)
+        evt["indicator_match"] = True
+        evt["indicator"] = item
+        # one batched call; repeated indicator values come straight from the embedding cache
+        base_emb, item_emb = embed_many([_event_text(evt), _indicator_text(item)])
+        evt["indicator_confidence"] = cosine(base_emb, item_emb)
+        metrics.incr("intel.hits_exact", 1)
+        # optionally, ask the LLM for a short rationale for high-confidence matches
+        if evt["indicator_confidence"] > 0.5:
+            prompt = f"Provide a one-line rationale for why this event matches CTI: event={to_json_safe(evt)[:300]}"
+            resp = await safe_ask_llm(prompt, max_tokens=80)
+            evt["indicator_rationale"] = resp.get("text")
+        return evt
+    # network pass: longest-prefix match against CIDR / range indicators
+    hit = index.network(evt.get("host"), meta.get("ip"))
+    if hit is not None:
+        item, plen, bits = hit
+        evt = dict(evt)
+        evt["indicator_match"] = True
+        evt["indicator"] = item
+        # a /32 (or /128) hit is as strong as an exact match; wider blocks weigh less
+        evt["indicator_confidence"] = plen / bits
+        metrics.incr("intel.hits_network", 1)
+        return evt
     # fuzzy pass: substring matching on meta values
-    for item in feed:
-        val = item.get("attributes", {}).get("value", "")
-        if val and (val in (evt.get("host") or "") or val in str(evt.get("meta", {}))):
-            evt = dict(evt)
-            evt["indicator_match"] = True
-            evt["indicator"] = item
-            evt["indicator_confidence"] = 0.35
-            metrics.incr("intel.hits_fuzzy", 1)
-            return evt
+    item = index.fuzzy(evt.get("host") or "", str(evt.get("meta", {})))
+    if item is not None:
+        evt = dict(evt)
+        evt["indicator_match"] = True
+        evt["indicator"] = item
+        evt["indicator_confidence"] = 0.35
+        metrics.incr("intel.hits_fuzzy", 1)
+        return evt
     # no hit
     return evt
 
@@ -87,17 +147,23 @@ async def intel_agent(state: "object") -> Command:  # type: ignore[name-defined]
     start = time.time()
     raw = state.evidence.get("raw", []) or []
     metrics.incr("intel.invocations", 1)
-    ttl = int(get_config("intel.cache_ttl_seconds") or 300)
-    feed = await _cached_feed(ttl=ttl)
+    snapshot = await _current_snapshot()
+    index = snapshot.index
     enriched: List[Dict[str, Any]] = []
     for evt in raw:
         try:
-            enriched_evt = await _enrich_event(evt, feed)
+            enriched_evt = await _enrich_event(evt, index)
             enriched.append(enriched_evt)
         except Exception as exc:
             logger.exception("Enrichment failed for event %s: %s", evt.get("id"), exc)
             metrics.incr("intel.errors", 1)
             enriched.append(evt)
+    if get_config("intel.semantic_match"):
+        try:
+            await _semantic_pass(enriched, snapshot)
+        except Exception as exc:
+            logger.exception("Semantic CTI pass failed: %s", exc)
+            metrics.incr("intel.errors", 1)
     state.evidence["enriched"] = enriched
     elapsed = time.time() - start
     metrics.timing("intel.duration_seconds", elapsed)
@@ -5,6 +5,12 @@ Features:
  - Templating with parameter substitution
  - Basic safety filtering to prevent dangerous tokens
  - Validation of ESQL structure and enforcement of limits
+ - Incremental hunts (query_builder.incremental): each hypothesis query is
+   bounded by `ts > <watermark>` and sorted by time, so a hunt only scans
+   events newer than the previous one (see lib/watermarks.py)
+ - Optional fusion of all hypotheses into one query (query_builder.fuse_hypotheses):
+   predicates are OR'ed and each row carries one boolean EVAL column per
+   hypothesis, which the detector uses to fan rows back out
  - Emits compiled query objects to state.evidence['queries']
 """
 from __future__ import annotations
@@ -12,7 +18,7 @@ from __future__ import annotations
 import logging
 import re
 import time
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 from langgraph.types import Command
 
@@ -20,6 +26,7 @@ from pydantic import BaseModel, Field, ValidationError
 
 from fastAPI.utils import get_config
 from fastAPI.utils import metrics
+from team_agents.agents.lib.watermarks import watermark_store
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +36,8 @@ class CompiledQuery(BaseModel):
     id: str = Field(...)
     query: str = Field(...)
     params: Dict[str, Any] = Field(default_factory=dict)
+    # fused queries only: tag column -> hypothesis id
+    fanout: Dict[str, str] = Field(default_factory=dict)
     created_at: float = Field(default_factory=time.time)
 
 def _render(template: str, params: Dict[str, Any]) -> str:
@@ -50,27 +59,81 @@ def _validate_query(q: str) -> bool:
         return False
     return True
 
+def _predicate(params: Dict[str, Any]) -> str:
+    # hypothesis predicate, bounded below by its watermark on incremental hunts
+    if "since" not in params:
+        return str(params.get("query"))
+    return f"{params['time_field']} > {params['since']} AND ({params['query']})"
+
+def _tag_column(hyp_id: str, taken: set) -> str:
+    base = "hyp_" + re.sub(r"\W", "_", str(hyp_id))
+    name, n = base, 1
+    while name in taken:
+        n += 1
+        name = f"{base}_{n}"
+    taken.add(name)
+    return name
+
+def _fuse(queries: List[CompiledQuery], limit: int) -> List[CompiledQuery]:
+    """
+    One query for every hypothesis: rows matching any predicate, tagged per
+    hypothesis. The limit grows with the number of hypotheses so each keeps
+    its own budget; falls back to the separate queries if the result is invalid.
+    """
+    if len(queries) < 2:
+        return queries
+    taken: set = set()
+    fanout: Dict[str, str] = {}
+    evals, preds = [], []
+    for cq in queries:
+        col = _tag_column(cq.id, taken)
+        fanout[col] = cq.id
+        evals.append(f"{col} = ({_predicate(cq.params)})")
+        preds.append(col)
+    template = "FROM logs | EVAL {{evals}} | WHERE {{where}}{{order}} | limit {{limit}}"
+    params: Dict[str, Any] = {"evals": ", ".join(evals), "where": " OR ".join(preds), "order": "", "limit": limit * len(queries)}
+    since = {cq.id: cq.params["since"] for cq in queries if "since" in cq.params}
+    if since:
+        params["order"] = f" | sort {queries[0].params['time_field']} asc"
+        params["since"] = since
+    rendered = _render(template, params)
+    if not _validate_query(rendered):
+        metrics.incr("query_builder.fusion_rejected", 1)
+        logger.warning("Fused query rejected, keeping %d separate queries", len(queries))
+        return queries
+    fused_id = "fused:" + "+".join(cq.id for cq in queries)
+    metrics.incr("query_builder.fused", len(queries))
+    return [CompiledQuery(id=fused_id, query=rendered, params=dict(params, limit=limit), fanout=fanout)]
+
 async def query_builder_agent(state: "object") -> Command:  # type: ignore[name-defined]
     start = time.time()
     hyps = state.evidence.get("hypotheses", []) or []
     limit = int(get_config("detector.esql_limit") or 1000)
+    incremental = bool(get_config("query_builder.incremental"))
+    time_field = get_config("query_builder.time_field") or "ts"
     compiled = []
     metrics.incr("query_builder.invocations", 1)
     for h in hyps:
         try:
+            hyp_id = h.get("id") or f"q_{int(time.time()*1000)}"
             template = "FROM logs WHERE {{query}} | limit {{limit}}"
             params = {"query": h.get("query"), "limit": limit}
+            if incremental:
+                template = "FROM logs WHERE {{time_field}} > {{since}} AND ({{query}}) | sort {{time_field}} asc | limit {{limit}}"
+                params.update(since=watermark_store().get(hyp_id), time_field=time_field)
             rendered = _render(template, params)
             if not _validate_query(rendered):
                 metrics.incr("query_builder.invalid", 1)
                 logger.warning("Invalid or unsafe query skipped: %s", rendered)
                 continue
-            cq = CompiledQuery(id=h.get("id") or f"q_{int(time.time()*1000)}", query=rendered, params=params)
+            cq = CompiledQuery(id=hyp_id, query=rendered, params=params)
             compiled.append(cq)
             metrics.incr("query_builder.compiled", 1)
         except ValidationError:
             metrics.incr("query_builder.validation_errors", 1)
             continue
+    if compiled and get_config("query_builder.fuse_hypotheses"):
+        compiled = _fuse(compiled, limit)
     state.evidence["queries"] = compiled
     elapsed = time.time() - start
     metrics.timing("query_builder.duration_seconds", elapsed)
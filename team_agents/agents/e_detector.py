@@ -2,80 +2,333 @@
 e_detector.py — Async detector capable of running ESQL or scoring events locally.
 
 Features:
- - Executes compiled queries using tools.elastic_esql.run_query (threadpool)
+ - Executes compiled queries concurrently on a pooled AsyncElasticsearch client
+   (detector.query_concurrency, detector.query_timeout_seconds per query)
+ - Streams results page by page (SQL cursor, detector.fetch_size) as column
+   batches and turns each page into alerts before fetching the next
+ - Complete query results cached per (normalized query, time bucket), so repeated
+   hunts in the same bucket skip the cluster
+ - Advances per-hypothesis watermarks after incremental (time-bounded) queries
+ - Fans rows of fused multi-hypothesis queries back out per hypothesis
+ - Evaluates hypothesis predicates in-process as vectorized masks over the
+   enriched events when there are no compiled queries (or detector.engine=local)
  - Supports fallback to local event inspection
- - Converts results into typed alerts with scoring heuristics
- - Optional LLM scoring for ambiguous events (async)
+ - Converts results into slotted AlertRecords with scoring heuristics; records
+   are passed on as-is and only serialized at the API boundary
+ - Optional LLM scoring of the highest-ranked alerts: one batch prompt per hunt,
+   scores cached by evidence fingerprint (detector.llm_score_*)
 """
 from __future__ import annotations
 
 import asyncio
+import hashlib
+import heapq
+import json
 import logging
+import re
 import time
-from typing import Any, Dict, List, Sequence
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
 
+import numpy as np
 from langgraph.types import Command
 from langgraph.graph import END
 
-from pydantic import BaseModel, Field
-
 from fastAPI.utils import metrics
 from fastAPI.utils import safe_ask_llm
+from fastAPI.utils import get_config
 from fastAPI.utils import run_query
-from team_agents.tools.elastic_esql import ESQLQuery
+from team_agents.agents.lib.alerts import AlertRecord
+from team_agents.agents.lib.predicates import EventTable, PredicateError, compile_predicate
+from team_agents.agents.lib.query_cache import QueryResultCache
+from team_agents.agents.lib.utils import LRUCache
+from team_agents.agents.lib.watermarks import next_watermark, watermark_store
+from team_agents.tools.elastic_esql import AsyncElasticsearch, ColumnBatch, ESQLQuery, ESQLResponse, iter_query_pages
 
 logger = logging.getLogger(__name__)
 
-class Alert(BaseModel):
-    id: str = Field(...)
-    evidence: Dict[str, Any] = Field(...)
-    score: float = Field(default=1.0)
-    tags: List[str] = Field(default_factory=list)
-    created_at: float = Field(default_factory=time.time)
-
-async def _run_compiled_queries(compiled: List[ESQLQuery]) -> List[Dict[str, Any]]:
-    rows = []
-    loop = asyncio.get_event_loop()
-    for q in compiled:
-        try:
-            # run_query is sync; execute in threadpool
-            resp = await loop.run_in_executor(None, run_query, ESQLQuery(query=q.query))
-            cols = [c["name"] for c in resp.columns]
-            for r in resp.rows:
-                rows.append(dict(zip(cols, r)))
-            metrics.incr("detector.query_rows", len(resp.rows))
-        except Exception as exc:
-            metrics.incr("detector.query_errors", 1)
-            logger.warning("Query failed: %s ; error=%s", q.query, exc)
-            continue
-    return rows
+_query_cache: Optional[QueryResultCache] = None
+_score_cache: Optional[LRUCache] = None
+
+def _result_cache() -> QueryResultCache:
+    global _query_cache
+    if _query_cache is None:
+        _query_cache = QueryResultCache(
+            max_entries=int(get_config("detector.cache_max_entries") or 256),
+            ttl=float(get_config("detector.cache_ttl_seconds") or 60),
+            bucket_seconds=float(get_config("detector.cache_bucket_seconds") or 60),
+            max_rows=int(get_config("detector.cache_max_rows") or 5000),
+        )
+    return _query_cache
+
+def _make_alert(aid: str, evidence: Dict[str, Any], severity: Any, derived: Any, ioc: Any, event: Any) -> AlertRecord:
+    score = float(severity) + float(derived)
+    tags = []
+    if ioc:
+        tags.append("ioc")
+    if event == "login_fail":
+        tags.append("auth.failure")
+    return AlertRecord(id=aid, evidence=evidence, score=score, tags=tags)
 
-def _rows_to_alerts(rows: Sequence[Dict[str, Any]]) -> List[Alert]:
+def _rows_to_alerts(rows: Sequence[Dict[str, Any]]) -> List[AlertRecord]:
     alerts = []
     for idx, r in enumerate(rows):
         aid = r.get("id") or f"alert_{int(time.time()*1000)}_{idx}"
-        score = float(r.get("severity", 1)) + float(r.get("derived_severity", 0))
-        tags = []
-        if r.get("indicator_match"):
-            tags.append("ioc")
-        if r.get("event") == "login_fail":
-            tags.append("auth.failure")
-        alerts.append(Alert(id=aid, evidence=r, score=score, tags=tags))
+        alerts.append(_make_alert(aid, r, r.get("severity", 1), r.get("derived_severity", 0),
+                                  r.get("indicator_match"), r.get("event")))
     return alerts
 
-async def _llm_score_alert(evidence: Dict[str, Any]) -> float:
-    # ask LLM for a short risk score suggestion (simulated if offline)
-    prompt = f"Given this event evidence, assign a risk score 0-10 and justify briefly: {evidence}"
-    resp = await safe_ask_llm(prompt, max_tokens=48)
+def _batch_to_alerts(batch: ColumnBatch, prefix: str = "", start: int = 0) -> List[AlertRecord]:
+    """Alerts from one page of results; scoring inputs are read column-wise."""
+    ids = batch.column("id")
+    severity = batch.column("severity", 1)
+    derived = batch.column("derived_severity", 0)
+    ioc = batch.column("indicator_match")
+    event = batch.column("event")
+    stamp = int(time.time() * 1000)
+    return [
+        _make_alert(ids[i] or f"alert_{stamp}_{prefix}{start + i}", batch.row(i),
+                    severity[i], derived[i], ioc[i], event[i])
+        for i in range(len(batch))
+    ]
+
+def _ts_values(values: Sequence[Any]) -> List[float]:
+    out = []
+    for v in values:
+        try:
+            out.append(float(v))
+        except (TypeError, ValueError):
+            continue
+    return out
+
+def _page_alerts(q: Any, qi: int, batch: ColumnBatch, counts: Dict[str, int],
+                 marks: Optional[Dict[str, List[float]]] = None) -> List[AlertRecord]:
+    """
+    Alerts for one page. For a fused query, each row becomes one alert per
+    hypothesis whose tag column is true (as if that hypothesis had run alone,
+    within its own limit); tag columns are dropped from the evidence.
+    With `marks`, the rows' timestamps are collected per hypothesis.
+    """
+    fanout: Dict[str, str] = getattr(q, "fanout", None) or {}
+    time_field = (getattr(q, "params", None) or {}).get("time_field", "ts")
+    if not fanout:
+        alerts = _batch_to_alerts(batch, prefix=f"{qi}_", start=counts.get("", 0))
+        counts[""] = counts.get("", 0) + len(alerts)
+        if marks is not None:
+            marks.setdefault(getattr(q, "id", ""), []).extend(_ts_values(batch.column(time_field)))
+        return alerts
+    per_limit = int((getattr(q, "params", None) or {}).get("limit") or len(batch))
+    names = [n for n in batch.names if n not in fanout]
+    alerts = []
+    for col, hyp in fanout.items():
+        room = per_limit - counts.get(hyp, 0)
+        if room <= 0:
+            continue
+        flags = batch.column(col, False)
+        idx = [i for i, flag in enumerate(flags) if flag][:room]
+        if idx and marks is not None:
+            ts = batch.column(time_field)
+            marks.setdefault(hyp, []).extend(_ts_values([ts[i] for i in idx]))
+        if idx:
+            alerts.extend(_batch_to_alerts(batch.select(idx, names), prefix=f"{qi}_{hyp}_", start=counts.get(hyp, 0)))
+            counts[hyp] = counts.get(hyp, 0) + len(idx)
+    metrics.incr("detector.fanout_alerts", len(alerts))
+    return alerts
+
+async def _query_pages(q: ESQLQuery, fetch_size: int, timeout: float) -> AsyncIterator[ColumnBatch]:
+    if AsyncElasticsearch is not None:
+        async for batch in iter_query_pages(ESQLQuery(query=q.query), fetch_size=fetch_size, timeout=timeout):
+            yield batch
+        return
+    # sync client only: one page from the threadpool, still bounded by the deadline
+    call = asyncio.get_running_loop().run_in_executor(None, run_query, ESQLQuery(query=q.query))
+    resp: ESQLResponse = await asyncio.wait_for(call, timeout)
+    yield ColumnBatch([c["name"] for c in resp.columns], resp.rows)
+
+def _advance_watermarks(q: Any, marks: Dict[str, List[float]], counts: Dict[str, int], complete: bool) -> int:
+    """
+    Move each hypothesis' watermark past what this query scanned. A hypothesis
+    that filled its limit may have more rows at its newest timestamp, so it is
+    treated as incomplete (see next_watermark).
+    """
+    params = getattr(q, "params", None) or {}
+    limit = int(params.get("limit") or 0)
+    fanout: Dict[str, str] = getattr(q, "fanout", None) or {}
+    store = watermark_store()
+    moved = 0
+    for hyp in (fanout.values() if fanout else [getattr(q, "id", "")]):
+        done = complete and counts.get(hyp if fanout else "", 0) < limit
+        seen = marks.get(hyp, ())
+        mark = next_watermark(seen, done)
+        if mark is None and seen:
+            # a whole result at one timestamp: moving past it is the only way forward
+            mark = max(seen)
+            logger.warning("Hypothesis %s filled its limit at a single timestamp (%s); advancing past it", hyp, mark)
+        if mark is not None and store.advance(hyp, mark):
+            moved += 1
+    return moved
+
+async def _run_one(q: ESQLQuery, qi: int, sem: asyncio.Semaphore, timeout: float,
+                   fetch_size: int, max_alerts: int) -> List[AlertRecord]:
+    alerts: List[AlertRecord] = []
+    cache = _result_cache() if get_config("detector.cache_enabled", True) else None
+    counts: Dict[str, int] = {}
+    # only time-bounded (incremental) queries move watermarks
+    marks: Optional[Dict[str, List[float]]] = {} if "since" in (getattr(q, "params", None) or {}) else None
+    cached = cache.get(q.query) if cache is not None else None
+    if cached is not None:
+        for batch in cached:
+            alerts.extend(_page_alerts(q, qi, batch, counts, marks))
+        if marks is not None:
+            _advance_watermarks(q, marks, counts, complete=len(alerts) <= max_alerts)
+        return alerts[:max_alerts]
+    async with sem:
+        started = time.time()
+        pages = _query_pages(q, fetch_size, timeout)
+        seen: Optional[List[ColumnBatch]] = [] if cache is not None else None
+        held = 0
+        complete = False
+        try:
+            async for batch in pages:
+                metrics.incr("detector.query_rows", len(batch))
+                alerts.extend(_page_alerts(q, qi, batch, counts, marks))
+                if len(alerts) >= max_alerts:
+                    metrics.incr("detector.results_truncated", 1)
+                    logger.warning("Query hit detector.max_alerts (%d); remaining pages skipped: %s", max_alerts, q.query)
+                    break
+                if seen is not None:
+                    seen.append(batch)
+                    held += len(batch)
+                    if held > cache.max_rows:
+                        seen = None  # too large to cache; stop holding pages
+            else:
+                complete = True
+                # only complete results are cached (no truncation, timeout or error)
+                if seen is not None:
+                    cache.set(q.query, seen)
+        except asyncio.TimeoutError:
+            metrics.incr("detector.query_timeouts", 1)
+            logger.warning("Query exceeded %.1fs deadline (%d alerts kept): %s", timeout, len(alerts), q.query)
+        except Exception as exc:
+            metrics.incr("detector.query_errors", 1)
+            logger.warning("Query failed: %s ; error=%s", q.query, exc)
+        finally:
+            await pages.aclose()  # clears the server-side cursor on early exit
+            metrics.timing("detector.query_seconds", time.time() - started)
+    if marks is not None:
+        # rows arrive in time order, so even a partial result is a safe prefix
+        _advance_watermarks(q, marks, counts, complete)
+    return alerts[:max_alerts]
+
+async def _run_compiled_queries(compiled: List[ESQLQuery]) -> List[AlertRecord]:
+    """
+    Run all queries concurrently and return their alerts. A failed query
+    contributes nothing; a timed-out one keeps the pages it already delivered.
+    """
+    sem = asyncio.Semaphore(max(1, int(get_config("detector.query_concurrency") or 4)))
+    timeout = float(get_config("detector.query_timeout_seconds") or 10)
+    fetch_size = int(get_config("detector.fetch_size") or 500)
+    max_alerts = int(get_config("detector.max_alerts") or 5000)
+    results = await asyncio.gather(*(_run_one(q, qi, sem, timeout, fetch_size, max_alerts)
+                                     for qi, q in enumerate(compiled)))
     try:
-        text = resp.get("text", "")
-        # parse leading number if present
-        first = text.strip().split()[0]
-        val = float(first)
-        return max(0.0, min(10.0, val))
-    except Exception:
-        # fallback: minor random scaling
-        return float(evidence.get("derived_severity", 0))
+        watermark_store().flush()
+    except OSError as exc:
+        logger.warning("Could not persist hunt watermarks: %s", exc)
+    # alerts keep query order, as with sequential execution
+    return [a for alerts in results for a in alerts][:max_alerts]
+
+def _local_alerts(hyps: Sequence[Dict[str, Any]], rows: Sequence[Any], limit: int) -> List[AlertRecord]:
+    """
+    Run each hypothesis query as a mask over the events, without Elasticsearch.
+    Columns are extracted once and shared by all hypotheses; like a compiled
+    query, each hypothesis yields at most `limit` rows.
+    """
+    started = time.time()
+    table = EventTable(rows)
+    alerts: List[AlertRecord] = []
+    for h in hyps:
+        try:
+            pred = compile_predicate(h.get("query") or "")
+        except PredicateError as exc:
+            metrics.incr("detector.local_invalid", 1)
+            logger.warning("Hypothesis %s has an unsupported query %r: %s", h.get("id"), h.get("query"), exc)
+            continue
+        idx = np.flatnonzero(pred.mask(table))[:limit]
+        metrics.incr("detector.local_matches", len(idx))
+        alerts.extend(_rows_to_alerts([rows[i] for i in idx]))
+    metrics.timing("detector.local_seconds", time.time() - started)
+    return alerts
+
+# evidence fields that identify an event rather than describe it; left out of prompts and fingerprints
+_VOLATILE_FIELDS = {"id", "ts", "timestamp", "@timestamp", "_id", "created_at"}
+_SCORE_LINE = re.compile(r"^\s*(\d+)\s*[:=]\s*(-?\d+(?:\.\d+)?)", re.MULTILINE)
+_PROMPT_VIEW_CHARS = 400  # evidence text per event in the scoring prompt
+
+def _scores():
+    global _score_cache
+    if _score_cache is None:
+        _score_cache = LRUCache(max_entries=int(get_config("detector.llm_score_cache_size") or 4096),
+                                ttl=float(get_config("detector.llm_score_cache_ttl_seconds") or 3600))
+    return _score_cache
+
+def _score_view(evidence: Dict[str, Any]) -> str:
+    """Canonical JSON of the evidence that matters for risk (untruncated: it is also the cache key)."""
+    view = {k: v for k, v in evidence.items() if k not in _VOLATILE_FIELDS and v is not None}
+    return json.dumps(view, sort_keys=True, separators=(",", ":"), default=str)
+
+def _evidence_key(view: str) -> str:
+    return hashlib.blake2b(view.encode("utf-8"), digest_size=16).hexdigest()
+
+def _score_prompt(views: List[str]) -> str:
+    lines = "\n".join(f"[{n}] {v[:_PROMPT_VIEW_CHARS]}" for n, v in enumerate(views, 1))
+    return ("Assign each security event below a risk score from 0 to 10.\n"
+            "Answer with one line per event in the form `<number>: <score>` and nothing else.\n"
+            f"{lines}")
+
+def _parse_scores(text: str, count: int) -> Dict[int, float]:
+    out: Dict[int, float] = {}
+    for m in _SCORE_LINE.finditer(text or ""):
+        n = int(m.group(1))
+        if 1 <= n <= count and n not in out:
+            out[n] = max(0.0, min(10.0, float(m.group(2))))
+    return out
+
+async def _score_alerts(alerts: List[AlertRecord], top_n: int) -> None:
+    """
+    Refine the scores of the top_n highest-ranked alerts with the LLM. Only
+    those alerts are fingerprinted; ones with identical evidence (ignoring ids
+    and timestamps) share one score, cached scores are reused and the misses
+    go out in a single batch prompt. A score is only ever raised, never lowered.
+    """
+    if top_n <= 0 or not alerts:
+        return
+    cache = _scores()
+    top = heapq.nlargest(top_n, alerts, key=lambda a: a.score)
+    keys: List[str] = []
+    views: Dict[str, str] = {}
+    for a in top:
+        view = _score_view(a.evidence)
+        keys.append(_evidence_key(view))
+        views.setdefault(keys[-1], view)
+    scores = {key: cache.get(key) for key in views}
+    misses = [key for key, val in scores.items() if val is None]
+    metrics.incr("detector.llm_score_cache_hits", len(views) - len(misses))
+    if misses:
+        started = time.time()
+        resp = await safe_ask_llm(_score_prompt([views[k] for k in misses]), max_tokens=8 * len(misses) + 16)
+        parsed = _parse_scores(resp.get("text", ""), len(misses))
+        for n, key in enumerate(misses, 1):
+            if n in parsed:
+                scores[key] = parsed[n]
+                cache.set(key, parsed[n])
+        metrics.incr("detector.llm_score_requests", 1)
+        metrics.incr("detector.llm_scored", len(parsed))
+        metrics.timing("detector.llm_score_seconds", time.time() - started)
+    # unanswered alerts keep their heuristic score (the fingerprint covers the whole evidence)
+    for a, key in zip(top, keys):
+        val = scores.get(key)
+        if val is not None:
+            a.score = max(a.score, val)
 
 async def detector_agent(state: "object") -> Command:  # type: ignore[name-defined]
     start = time.time()
@@ -83,33 +336,31 @@ async def detector_agent(state: "object") -> Command:  # type: ignore[name-defin
     raw = state.evidence.get("raw", []) or []
     metrics.incr("detector.invocations", 1)
 
-    rows = []
-    if compiled:
+    hyps = state.evidence.get("hypotheses", []) or []
+    local = get_config("detector.engine") == "local"
+    if compiled and not local:
         logger.info("Detector executing %d compiled queries", len(compiled))
-        rows = await _run_compiled_queries(compiled)
+        alerts = await _run_compiled_queries(compiled)
+    elif hyps:
+        events = state.evidence.get("enriched") or raw
+        logger.info("Detector evaluating %d hypotheses locally over %d events", len(hyps), len(events))
+        alerts = _local_alerts(hyps, events, int(get_config("detector.esql_limit") or 1000))
     else:
         logger.info("Detector using raw events inspection (%d events)", len(raw))
-        rows = raw
-
-    alerts = _rows_to_alerts(rows)
+        alerts = _rows_to_alerts(raw)
     if not alerts:
         logger.info("Detector found no alerts, moving to end")
         return Command(goto=END)
 
-    # Optionally use LLM to refine scores for top-N alerts
+    # Optionally use LLM to refine scores for the top-N alerts
     try:
-        top_n = min(3, len(alerts))
-        tasks = [asyncio.create_task(_llm_score_alert(a.evidence)) for a in alerts[:top_n]]
-        idx = 0
-        for t in tasks:
-            try:
-                new_score = await t
-                alerts[idx].score = max(alerts[idx].score, new_score)
-            except Exception:
-                pass
-            idx += 1
+        try:
+            await _score_alerts(alerts, int(get_config("detector.llm_score_top_n", 3)))
+        except Exception as exc:
+            metrics.incr("detector.llm_score_errors", 1)
+            logger.warning("LLM scoring failed, keeping heuristic scores: %s", exc)
         metrics.incr("detector.alerts_emitted", len(alerts))
-        state.alerts = [a.dict() for a in alerts]
+        state.alerts = alerts
         logger.info("Detector emitted %d alerts", len(alerts))
     except Exception as exc:
         logger.exception("Detector failed during scoring: %s, moving to end", exc)
@@ -2,17 +2,26 @@
 f_correlator.py — Async incident correlator and summarizer.
 
 Features:
- - Groups alerts by host/IP and time windows
- - Merges similar alerts into incidents, computes aggregated severity
- - Optionally asks LLM to summarize clusters for analyst consumption
+ - Links alerts that share an entity (host, user, ip, indicator) within
+   correlator.window_seconds, using union-find over an inverted entity index
+   (lib/correlation.py); each connected group becomes one incident
+ - Computes aggregated severity, entities and first/last seen per incident
+ - Upserts incidents into the persistent incident store (correlator.store_path),
+   so a campaign spanning several hunts keeps one incident id; each incident
+   carries `changed` so unchanged ones are not re-summarized downstream.
+   Incidents not seen for correlator.retention_seconds are pruned afterwards
+ - Optionally asks LLM to summarize clusters for analyst consumption, from
+   a bounded projection of the cluster; summaries are cached by the
+   projection's digest (lib/summary_cache.py), so identical clusters cost no call
  - Stores incident(s) under state.evidence['incident']
 """
 from __future__ import annotations
 
+import asyncio
 import logging
+import sqlite3
 import time
 import uuid
-from collections import defaultdict
 from typing import Any, Dict, List
 
 from langgraph.types import Command
@@ -20,20 +29,76 @@ from langgraph.graph import END
 
 from fastAPI.utils import safe_ask_llm
 from fastAPI.utils import metrics
+from fastAPI.utils import get_config
+from team_agents.agents.lib.correlation import EntityCorrelator
+from team_agents.agents.lib.incident_store import IncidentStore, incident_store
+from team_agents.agents.lib.summary_cache import project_incident, projection_text, summary_cache, summary_key
 
 logger = logging.getLogger(__name__)
 
-def _group_alerts(alerts: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
-    groups = defaultdict(list)
-    for a in alerts:
-        host = a.get("evidence", {}).get("host") or a.get("evidence", {}).get("meta", {}).get("host") or "unknown"
-        groups[host].append(a)
-    return groups
+def _build_incidents(alerts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    engine = EntityCorrelator(window_seconds=float(get_config("correlator.window_seconds", 3600)))
+    engine.add(alerts)
+    incidents = []
+    for members in engine.groups():
+        group = [engine.alerts[i] for i in members]
+        entities = sorted({key for i in members for key in engine.entities[i]})
+        hosts = [key.split(":", 1)[1] for key in entities if key.startswith("host:")]
+        incidents.append({
+            "id": f"incident:{uuid.uuid4().hex[:8]}",
+            "hosts": hosts or ["unknown"],
+            "entities": entities,
+            "alerts": group,
+            "severity": max(a.get("score", 1) for a in group),
+            "first_seen": engine.times[members[0]],
+            "last_seen": engine.times[members[-1]],
+            "created_at": time.time(),
+            "alert_count": len(group),
+        })
+    return incidents
+
+def _upsert_all(store: IncidentStore, incidents: List[Dict[str, Any]], retention: float) -> List[Dict[str, Any]]:
+    by_id: Dict[str, Dict[str, Any]] = {}
+    for incident in incidents:
+        stored = store.upsert(incident)
+        merged = by_id.get(stored["id"])
+        # two groups of this hunt can land in the same stored incident
+        alerts = (merged["alerts"] if merged else []) + incident["alerts"]
+        hosts = [e.split(":", 1)[1] for e in stored["entities"] if e.startswith("host:")]
+        by_id[stored["id"]] = dict(incident, **{k: stored[k] for k in (
+            "id", "severity", "alert_count", "entities", "first_seen", "last_seen", "created_at", "digest", "changed")},
+            hosts=hosts or ["unknown"], alerts=alerts)
+        metrics.incr("correlator.store_merges" if stored["merged"] else "correlator.store_inserts", 1)
+    if retention > 0:
+        metrics.incr("correlator.store_pruned", store.prune(time.time() - retention))
+    return list(by_id.values())
+
+async def _persist(incidents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    store = incident_store()
+    if store is None:
+        return incidents
+    retention = float(get_config("correlator.retention_seconds", 604800))
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, _upsert_all, store, incidents, retention)
+    except sqlite3.Error as exc:
+        metrics.incr("correlator.store_errors", 1)
+        logger.warning("Incident store upsert failed, keeping hunt-local incidents: %s", exc)
+        return incidents
 
 async def _summarize_incident(incident: Dict[str, Any]) -> str:
-    prompt = f"Summarize this incident briefly for an analyst: {incident}"
+    projection = project_incident(incident)
+    key = summary_key("summary", projection)
+    cache = summary_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        metrics.incr("correlator.summary_cache_hits", 1)
+        return cached
+    prompt = f"Summarize this incident briefly for an analyst: {projection_text(projection)}"
     resp = await safe_ask_llm(prompt, max_tokens=120)
-    return resp.get("text", "")
+    text = resp.get("text", "")
+    if text:
+        cache.set(key, text)
+    return text
 
 async def correlator_agent(state: "object") -> Command:  # type: ignore[name-defined]
     alerts = getattr(state, "alerts", []) or []
@@ -43,29 +108,31 @@ async def correlator_agent(state: "object") -> Command:  # type: ignore[name-def
         return Command(goto=END)
 
     logger.info("Correlator received %d alerts", len(alerts))
-    groups = _group_alerts(alerts)
-    incidents = []
-    for host, group in groups.items():
-        try:
-            incident_id = f"incident:{uuid.uuid4().hex[:8]}"
-            severity = max(a.get("score", 1) for a in group)
-            incident = {"id": incident_id, "hosts": [host], "alerts": group, "severity": severity, "created_at": time.time(), "alert_count": len(group)}
-            incidents.append(incident)
-            metrics.incr("correlator.incidents", 1)
-        except Exception:
-            metrics.incr("correlator.group_errors", 1)
-            continue
+    started = time.time()
+    try:
+        incidents = _build_incidents(alerts)
+    except Exception as exc:
+        metrics.incr("correlator.group_errors", 1)
+        logger.exception("Correlation failed: %s, moving to end", exc)
+        return Command(goto=END)
+    metrics.timing("correlator.link_seconds", time.time() - started)
+    incidents = await _persist(incidents)
+    metrics.incr("correlator.incidents", len(incidents))
 
     # If multiple incidents, create a cluster summary
     if len(incidents) > 1:
-        cluster = {"id": f"cluster:{uuid.uuid4().hex[:6]}", "incidents": incidents, "severity": max(i["severity"] for i in incidents), "created_at": time.time()}
-        # ask LLM for a human summary
-        try:
-            summary = await _summarize_incident(cluster)
-            cluster["summary"] = summary
-            metrics.incr("correlator.llm_summaries", 1)
-        except Exception:
-            metrics.incr("correlator.summary_errors", 1)
+        cluster = {"id": f"cluster:{uuid.uuid4().hex[:6]}", "incidents": incidents, "severity": max(i["severity"] for i in incidents), "created_at": time.time(),
+                   "changed": any(i.get("changed", True) for i in incidents)}
+        # ask LLM for a human summary, unless every incident is as already handled
+        if cluster["changed"]:
+            try:
+                summary = await _summarize_incident(cluster)
+                cluster["summary"] = summary
+                metrics.incr("correlator.llm_summaries", 1)
+            except Exception:
+                metrics.incr("correlator.summary_errors", 1)
+        else:
+            metrics.incr("correlator.summaries_skipped", 1)
         state.evidence["incident"] = cluster
         logger.info("Correlator created cluster with %d sub-incidents", len(incidents))
     else:
@@ -2,9 +2,12 @@
 g_responder.py — Async responder that creates narrative and triggers SOAR.
 
 Features:
- - Generates an analyst-facing narrative using the LLM
+ - Generates an analyst-facing narrative using the LLM, from a bounded
+   projection of the incident; stories are cached by the projection's digest
  - Invokes SOAR (via tools.soar_actions.perform_action) with retry/backoff
  - Persists action results in state.evidence['soar_result']
+ - Skips incidents whose content was already handled (incident store digest)
+   and marks the ones it handled
 """
 from __future__ import annotations
 
@@ -20,14 +23,26 @@ from fastAPI.utils import safe_ask_llm
 from fastAPI.utils import perform_action
 from fastAPI.utils import get_config
 from fastAPI.utils import metrics
+from team_agents.agents.lib.incident_store import incident_store
+from team_agents.agents.lib.summary_cache import project_incident, projection_text, summary_cache, summary_key
 from team_agents.tools.soar_actions import SOARAction
 
 logger = logging.getLogger(__name__)
 
 async def _generate_story(incident: Dict[str, Any]) -> str:
-    prompt = f"Create a concise incident summary for analysts from this structured incident: {incident}"
+    projection = project_incident(incident)
+    key = summary_key("story", projection)
+    cache = summary_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        metrics.incr("responder.story_cache_hits", 1)
+        return cached
+    prompt = f"Create a concise incident summary for analysts from this structured incident: {projection_text(projection)}"
     resp = await safe_ask_llm(prompt, max_tokens=180)
-    return resp.get("text", "")
+    text = resp.get("text", "")
+    if text:
+        cache.set(key, text)
+    return text
 
 async def _invoke_soar(action_name: str, params: Dict[str, Any], retries: int = 3) -> Optional[Dict[str, Any]]:
     last_exc = None
@@ -51,6 +66,11 @@ async def responder_agent(state: "object") -> Command:  # type: ignore[name-defi
         logger.info("nothing to respond to, moving to end")
         return Command(goto=END)
     metrics.incr("responder.invocations", 1)
+    parts = incident.get("incidents") or [incident]
+    if not any(p.get("changed", True) for p in parts):
+        metrics.incr("responder.skipped_unchanged", 1)
+        logger.info("incident %s unchanged since last handled, moving to end", incident.get("id"))
+        return Command(goto=END)
     try:
         story_text = await _generate_story(incident)
         state.story = {"summary": story_text, "generated_at": time.time()}
@@ -60,6 +80,12 @@ async def responder_agent(state: "object") -> Command:  # type: ignore[name-defi
         result = await _invoke_soar(action_name, params, retries=3)
         state.evidence["soar_result"] = result
         metrics.incr("responder.soar_calls", 1 if result else 0)
+        store = incident_store()
+        if store is not None and result is not None and result.get("status") != "error":
+            # a failed SOAR call leaves the incident changed, so the next hunt retries it
+            handled = [(p["id"], p["digest"]) for p in parts if p.get("digest")]
+            if handled:
+                await asyncio.get_running_loop().run_in_executor(None, store.mark_handled_many, handled)
         logger.info("Responder generated story and invoked SOAR (result=%s)", result)
     except Exception as exc:
         logger.exception("Responder failed: %s", exc)
@@ -0,0 +1,89 @@
+"""
+alerts.py — compact alert records and the JSON encoder used at the API boundary.
+
+Contains:
+ - AlertRecord: __slots__ alert (id, evidence, score, tags, created_at) that
+   is also a read-only Mapping, so agents keep using a.get("evidence") /
+   a["score"] on it without a dict copy per alert
+ - dumps(): serialize a payload holding AlertRecords to JSON bytes in one
+   pass (orjson when installed, else the stdlib encoder)
+
+Alerts are created without validation and stay records through the
+pipeline; they become JSON only once, when a response is written.
+"""
+from __future__ import annotations
+
+import json
+import time
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional
+
+try:  # optional, faster JSON encoding
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    orjson = None
+
+FIELDS = ("id", "evidence", "score", "tags", "created_at")
+
+
+class AlertRecord(Mapping):
+    __slots__ = FIELDS
+
+    def __init__(
+        self,
+        id: str,
+        evidence: Dict[str, Any],
+        score: float = 1.0,
+        tags: Optional[List[str]] = None,
+        created_at: Optional[float] = None,
+    ) -> None:
+        self.id = id
+        self.evidence = evidence
+        self.score = float(score)
+        self.tags = tags if tags is not None else []
+        self.created_at = time.time() if created_at is None else created_at
+
+    # ---- Mapping view ----
+    def __getitem__(self, key: str) -> Any:
+        if key not in FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in FIELDS else default
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(FIELDS)
+
+    def __len__(self) -> int:
+        return len(FIELDS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "evidence": self.evidence, "score": self.score,
+                "tags": self.tags, "created_at": self.created_at}
+
+    dict = to_dict  # pydantic-style spelling used by older callers
+
+    def __repr__(self) -> str:
+        # same text as the dict it replaces, so prompts built with f-strings are unchanged
+        return repr(self.to_dict())
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, AlertRecord):
+        return obj.to_dict()
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    item = getattr(obj, "item", None)  # numpy scalars
+    if callable(item):
+        try:
+            return item()
+        except Exception:
+            pass
+    return str(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, separators=(",", ":")).encode("utf-8")
@@ -12,10 +12,55 @@ from typing import Any, Dict, Optional
 DEFAULTS: Dict[str, Any] = {
     "collector.batch_size": 500,
     "collector.max_retries": 3,
+    "collector.enrich_concurrency": 8,
+    "collector.fingerprint": "sha256",
+    "collector.dedup_window_seconds": 60,
+    "collector.dedup_capacity": 200000,
+    "collector.dedup_fp_rate": 0.001,
+    "collector.dedup_slices": 4,
+    "collector.file_source_path": "",
+    "collector.file_checkpoint_path": "",
+    "collector.file_chunk_bytes": 4194304,
+    "collector.file_workers": 0,
     "intel.cache_ttl_seconds": 300,
+    "intel.refresh_ahead_ratio": 0.8,
+    "intel.feed_retry_seconds": 30,
+    "intel.snapshot_path": "data/cti_snapshot.bin",
+    "intel.semantic_match": False,
+    "intel.semantic_threshold": 0.85,
     "detector.esql_limit": 1000,
+    "query_builder.fuse_hypotheses": False,
+    "query_builder.incremental": False,
+    "query_builder.time_field": "ts",
+    "query_builder.watermark_path": "data/hunt_watermarks.json",
+    "query_builder.initial_lookback_seconds": 3600,
+    "detector.engine": "esql",
+    "detector.llm_score_top_n": 3,
+    "detector.llm_score_cache_size": 4096,
+    "detector.llm_score_cache_ttl_seconds": 3600,
+    "detector.query_concurrency": 4,
+    "detector.query_timeout_seconds": 10,
+    "detector.fetch_size": 500,
+    "detector.max_alerts": 5000,
+    "detector.cache_enabled": True,
+    "detector.cache_ttl_seconds": 60,
+    "detector.cache_bucket_seconds": 60,
+    "detector.cache_max_entries": 256,
+    "detector.cache_max_rows": 5000,
     "responder.soar_action": "isolate_host",
     "correlator.merge_threshold": 2,
+    "correlator.window_seconds": 3600,
+    "correlator.store_path": "data/incidents.db",
+    "correlator.retention_seconds": 604800,
+    "summaries.max_alerts": 5,
+    "summaries.max_entities": 20,
+    "summaries.max_incidents": 5,
+    "summaries.cache_size": 1024,
+    "summaries.cache_ttl_seconds": 86400,
+    "streaming.batch_size": 500,
+    "streaming.max_wait_seconds": 1.0,
+    "streaming.max_inflight": 2,
+    "ingest.ws_credits": 1000,
 }
 
 def get_config(key: str, default: Optional[Any] = None) -> Any:
@@ -0,0 +1,146 @@
+"""
+correlation.py — entity-graph correlation of alerts with sliding time windows.
+
+Contains:
+ - alert_entities(): entity keys of an alert ("host:..", "user:..", "ip:..", "ioc:..")
+ - UnionFind: disjoint sets over integer ids (path halving, union by size)
+ - EntityCorrelator: incremental engine; add() links each alert to the
+   latest earlier alert sharing any entity within window_seconds, and
+   groups() returns the connected components
+
+Alerts are processed in time order. The inverted index keeps only the
+latest (timestamp, alert) per entity: linking to it is enough, because every
+earlier alert of that entity inside the window is already in the same set.
+So each alert costs one index lookup and at most one union per entity,
+which is near-linear in the number of alerts.
+
+Two alerts that share an entity but are further apart than the window are
+not linked directly. They can still end up together through alerts in between.
+"""
+from __future__ import annotations
+
+import ipaddress
+import time
+from typing import Any, Dict, Iterable, List, Mapping, Tuple
+
+_IGNORED = {"", "unknown", "none", "null", "-"}
+# evidence / meta field -> entity kind
+_ENTITY_FIELDS = (("host", "host"), ("user", "user"), ("ip", "ip"), ("src_ip", "ip"), ("dst_ip", "ip"),
+                  ("source_ip", "ip"), ("dest_ip", "ip"), ("client_ip", "ip"))
+
+
+def _is_ip(value: str) -> bool:
+    if not value or not (value[0].isdigit() or ":" in value):
+        return False  # skip the parser for ordinary host names
+    try:
+        ipaddress.ip_address(value)
+        return True
+    except ValueError:
+        return False
+
+
+def alert_entities(alert: Mapping[str, Any]) -> List[str]:
+    evidence = alert.get("evidence") or {}
+    meta = evidence.get("meta") or {}
+    found: List[Tuple[str, Any]] = []
+    for source in (evidence, meta) if meta else (evidence,):
+        for name, kind in _ENTITY_FIELDS:
+            value = source.get(name)
+            if value is not None:
+                found.append((kind, value))
+    indicator = evidence.get("indicator")
+    if isinstance(indicator, dict):
+        found.append(("ioc", (indicator.get("attributes") or {}).get("value") or indicator.get("id")))
+
+    keys: List[str] = []
+    for kind, value in found:
+        if value is None or isinstance(value, (dict, list)):
+            continue
+        text = str(value).strip().lower()
+        if text in _IGNORED:
+            continue
+        for key in (f"{kind}:{text}", f"ip:{text}" if kind == "host" and _is_ip(text) else None):
+            # hosts are often recorded as addresses; the extra ip key links them with ip fields
+            if key is not None and key not in keys:
+                keys.append(key)
+    return keys
+
+
+def alert_time(alert: Mapping[str, Any]) -> float:
+    evidence = alert.get("evidence") or {}
+    for value in (evidence.get("ts"), evidence.get("timestamp"), alert.get("created_at")):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            continue
+    return time.time()
+
+
+class UnionFind:
+    __slots__ = ("parent", "size")
+
+    def __init__(self) -> None:
+        self.parent: List[int] = []
+        self.size: List[int] = []
+
+    def make(self) -> int:
+        self.parent.append(len(self.parent))
+        self.size.append(1)
+        return len(self.parent) - 1
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> int:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return ra
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+        return ra
+
+
+class EntityCorrelator:
+    def __init__(self, window_seconds: float = 3600) -> None:
+        self.window_seconds = float(window_seconds)
+        self.alerts: List[Any] = []
+        self.times: List[float] = []
+        self.entities: List[List[str]] = []
+        self._sets = UnionFind()
+        # entity -> (timestamp, alert id) of the latest alert that carried it
+        self._index: Dict[str, Tuple[float, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.alerts)
+
+    def add(self, alerts: Iterable[Any]) -> None:
+        batch = [(alert_time(a), a) for a in alerts]
+        batch.sort(key=lambda pair: pair[0])
+        window = self.window_seconds
+        index = self._index
+        for ts, alert in batch:
+            aid = self._sets.make()
+            keys = alert_entities(alert)
+            self.alerts.append(alert)
+            self.times.append(ts)
+            self.entities.append(keys)
+            for key in keys:
+                prev = index.get(key)
+                if prev is not None and abs(ts - prev[0]) <= window:
+                    self._sets.union(aid, prev[1])
+                if prev is None or ts >= prev[0]:
+                    index[key] = (ts, aid)
+
+    def groups(self) -> List[List[int]]:
+        """Alert ids per connected component, each in time order, largest first."""
+        out: Dict[int, List[int]] = {}
+        for aid in range(len(self.alerts)):
+            out.setdefault(self._sets.find(aid), []).append(aid)
+        groups = [sorted(members, key=self.times.__getitem__) for members in out.values()]
+        return sorted(groups, key=len, reverse=True)
@@ -0,0 +1,357 @@
+"""
+cti_snapshot.py — memory-mapped on-disk snapshot of the normalized CTI feed.
+
+Contains:
+ - write_snapshot(): serialise feed items plus their compiled lookup index
+ - SnapshotIndex: read-only IndicatorIndex look-alike served straight from mmap
+ - SnapshotItems: lazy sequence decoding feed items on access
+
+File layout (native byte order, sections 8-byte aligned):
+
+    magic(8) | version u32 | toc length u32 | toc JSON | sections...
+
+The JSON table of contents records metadata (sync validators, fetched_at)
+and the offset / length / typecode of each section:
+
+    items_off, items          item JSON blobs and their offsets
+    val_hash, val_item,       exact-value table sorted by 64-bit hash, with
+    val_off, vals             first holder and the value bytes for verification
+    ac_fail, ac_value,        flattened Aho-Corasick automaton; edges of node n
+    ac_dict, ac_edge_start,   live in [ac_edge_start[n], ac_edge_start[n+1])
+    ac_edge_char, ac_edge_next
+    v4_* / v6_*               flattened Patricia tries (key hi/lo, plen,
+                              left, right, item)
+
+Files are opened with ACCESS_READ so every worker maps the same page-cache
+pages; nothing is parsed up front beyond the table of contents.
+
+The writer refuses an index that references positions missing from the
+held items, so every value, automaton output and trie node points at a
+stored item. Readers still skip -1 slots (automaton nodes without a value,
+trie nodes without an owner).
+"""
+from __future__ import annotations
+
+import hashlib
+import ipaddress
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from team_agents.agents.lib.indicator_index import IndicatorIndex
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CTISNAP\x01"
+VERSION = 1
+_HEADER = struct.Struct("<8sII")
+_MASK64 = (1 << 64) - 1
+
+
+def _value_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _pad(n: int) -> int:
+    return (8 - n % 8) % 8
+
+
+# -----------------------
+# Writer
+# -----------------------
+def write_snapshot(
+    path: str,
+    held: Sequence[Tuple[int, Dict[str, Any]]],
+    index: IndicatorIndex,
+    meta: Optional[Dict[str, Any]] = None,
+) -> int:
+    """
+    Write `held` ((index position, item) pairs) and `index` to `path` atomically.
+    Returns the number of bytes written; raises ValueError, without touching
+    `path`, when the index references positions that are not in `held`.
+    """
+    ordered = sorted(held, key=lambda h: h[0])
+    slot = {pos: i for i, (pos, _) in enumerate(ordered)}
+    sections: Dict[str, Tuple[str, bytes]] = {}
+
+    # items
+    offsets = array("Q", [0])
+    blobs: List[bytes] = []
+    total = 0
+    for _, item in ordered:
+        blob = json.dumps(item, separators=(",", ":"), default=str).encode("utf-8")
+        blobs.append(blob)
+        total += len(blob)
+        offsets.append(total)
+    sections["items_off"] = ("Q", offsets.tobytes())
+    sections["items"] = ("B", b"".join(blobs))
+
+    values, automaton, trie, networks = index.export()
+    missing = sum(1 for pos in (*values.values(), *networks.values()) if pos not in slot)
+    if missing:
+        raise ValueError(f"index references {missing} positions that are not in the held items")
+
+    # exact-value table sorted by hash
+    rows = sorted((_value_hash(v), v, slot[pos]) for v, pos in values.items())
+    value_slot = {v: i for i, (_, v, _) in enumerate(rows)}
+    val_off = array("Q", [0])
+    val_blobs: List[bytes] = []
+    total = 0
+    for _, v, _ in rows:
+        raw = v.encode("utf-8")
+        val_blobs.append(raw)
+        total += len(raw)
+        val_off.append(total)
+    sections["val_hash"] = ("Q", array("Q", (h for h, _, _ in rows)).tobytes())
+    sections["val_item"] = ("I", array("I", (i for _, _, i in rows)).tobytes())
+    sections["val_off"] = ("Q", val_off.tobytes())
+    sections["vals"] = ("B", b"".join(val_blobs))
+
+    # Aho-Corasick automaton (node outputs point at the value table)
+    fail, pattern, dict_link, edges = automaton.flatten()
+    patterns = automaton.patterns
+    edge_start = array("I", [0])
+    edge_char = array("I")
+    edge_next = array("I")
+    for node_edges in edges:
+        for code, child in node_edges:
+            edge_char.append(code)
+            edge_next.append(child)
+        edge_start.append(len(edge_char))
+    sections["ac_fail"] = ("I", array("I", fail).tobytes())
+    sections["ac_value"] = ("i", array("i", (value_slot[patterns[p]] if p != -1 else -1 for p in pattern)).tobytes())
+    sections["ac_dict"] = ("i", array("i", dict_link).tobytes())
+    sections["ac_edge_start"] = ("I", edge_start.tobytes())
+    sections["ac_edge_char"] = ("I", edge_char.tobytes())
+    sections["ac_edge_next"] = ("I", edge_next.tobytes())
+
+    # prefix tries (node values are networks; map them to their first holder)
+    for version, family in trie.families().items():
+        nodes = family.flatten()
+        prefix = f"v{version}_"
+        sections[prefix + "hi"] = ("Q", array("Q", ((k >> 64) & _MASK64 for k, _, _, _, _ in nodes)).tobytes())
+        sections[prefix + "lo"] = ("Q", array("Q", (k & _MASK64 for k, _, _, _, _ in nodes)).tobytes())
+        sections[prefix + "plen"] = ("I", array("I", (p for _, p, _, _, _ in nodes)).tobytes())
+        sections[prefix + "left"] = ("i", array("i", (l for _, _, l, _, _ in nodes)).tobytes())
+        sections[prefix + "right"] = ("i", array("i", (r for _, _, _, r, _ in nodes)).tobytes())
+        sections[prefix + "item"] = ("i", array("i", (
+            slot[networks[v]] if v is not None else -1 for _, _, _, _, v in nodes
+        )).tobytes())
+
+    # lay out the table of contents, then the sections; offsets depend on the
+    # toc length, so reserve room and retry until the encoded toc fits
+    toc: Dict[str, Any] = {"byteorder": sys.byteorder, "count": len(ordered), "meta": meta or {}, "sections": {}}
+    reserved = 0
+    while True:
+        offset = _HEADER.size + reserved
+        offset += _pad(offset)
+        for name, (code, data) in sections.items():
+            toc["sections"][name] = [offset, len(data), code]
+            offset += len(data) + _pad(len(data))
+        toc_bytes = json.dumps(toc, separators=(",", ":")).encode("utf-8")
+        if len(toc_bytes) <= reserved:
+            toc_bytes = toc_bytes.ljust(reserved)
+            break
+        reserved = len(toc_bytes) + 64
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(_HEADER.pack(MAGIC, VERSION, len(toc_bytes)))
+        fh.write(toc_bytes)
+        fh.write(b"\0" * _pad(_HEADER.size + len(toc_bytes)))
+        for _, data in sections.values():
+            fh.write(data)
+            fh.write(b"\0" * _pad(len(data)))
+        size = fh.tell()
+    os.replace(tmp, path)
+    return size
+
+
+# -----------------------
+# Reader
+# -----------------------
+class SnapshotItems(Sequence):
+    """Feed items decoded lazily from the snapshot."""
+
+    def __init__(self, snapshot: "SnapshotIndex") -> None:
+        self._snapshot = snapshot
+
+    def __len__(self) -> int:
+        return len(self._snapshot)
+
+    def __getitem__(self, i):  # type: ignore[override]
+        if isinstance(i, slice):
+            return [self._snapshot.item(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._snapshot.item(i)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self._snapshot.item(i)
+
+
+class SnapshotIndex:
+    """
+    Read-only index answering exact(), fuzzy() and network() from a mapped snapshot.
+
+    Items are decoded on first access and memoised; all other lookups read
+    the mapped arrays directly.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, toc_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"not a CTI snapshot (v{VERSION}): {path}")
+        toc = json.loads(bytes(self._mm[_HEADER.size:_HEADER.size + toc_len]))
+        if toc.get("byteorder") != sys.byteorder:
+            raise ValueError("CTI snapshot was written with a different byte order")
+        self.meta: Dict[str, Any] = toc.get("meta") or {}
+        self._count = int(toc["count"])
+        view = self._view = memoryview(self._mm)
+        self._s: Dict[str, memoryview] = {}
+        for name, (offset, length, code) in toc["sections"].items():
+            section = view[offset:offset + length]
+            self._s[name] = section if code == "B" else section.cast(code)
+        self._decoded: Dict[int, Dict[str, Any]] = {}
+        self.items = SnapshotItems(self)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        for section in self._s.values():
+            section.release()
+        self._s.clear()
+        self._view.release()
+        self._mm.close()
+
+    def item(self, i: int) -> Dict[str, Any]:
+        hit = self._decoded.get(i)
+        if hit is None:
+            off = self._s["items_off"]
+            hit = json.loads(bytes(self._s["items"][off[i]:off[i + 1]]))
+            self._decoded[i] = hit
+        return hit
+
+    def _value_at(self, j: int) -> bytes:
+        off = self._s["val_off"]
+        return bytes(self._s["vals"][off[j]:off[j + 1]])
+
+    def exact(self, *candidates: Any) -> Optional[Dict[str, Any]]:
+        hashes, owners = self._s["val_hash"], self._s["val_item"]
+        best: Optional[int] = None
+        for c in candidates:
+            if not c or not isinstance(c, str):
+                continue
+            h = _value_hash(c)
+            raw = c.encode("utf-8")
+            j = bisect_left(hashes, h)
+            while j < len(hashes) and hashes[j] == h:
+                if self._value_at(j) == raw:
+                    if best is None or owners[j] < best:
+                        best = owners[j]
+                    break
+                j += 1
+        return self.item(best) if best is not None else None
+
+    def fuzzy(self, *texts: str) -> Optional[Dict[str, Any]]:
+        fail, value, dict_link = self._s["ac_fail"], self._s["ac_value"], self._s["ac_dict"]
+        start, chars, nxt = self._s["ac_edge_start"], self._s["ac_edge_char"], self._s["ac_edge_next"]
+        owners = self._s["val_item"]
+
+        def step(node: int, code: int) -> int:
+            lo, hi = start[node], start[node + 1]
+            if lo == hi:
+                return -1
+            j = bisect_left(chars, code, lo, hi)
+            return nxt[j] if j < hi and chars[j] == code else -1
+
+        best: Optional[int] = None
+        for text in texts:
+            if not text:
+                continue
+            node = 0
+            for ch in text:
+                code = ord(ch)
+                child = step(node, code)
+                while child == -1 and node:
+                    node = fail[node]
+                    child = step(node, code)
+                node = child if child != -1 else 0
+                out = node if value[node] != -1 else dict_link[node]
+                while out != -1:
+                    j = value[out]
+                    if j != -1:
+                        owner = owners[j]
+                        if best is None or owner < best:
+                            best = owner
+                    out = dict_link[out]
+        return self.item(best) if best is not None else None
+
+    def _longest_prefix(self, version: int, key: int) -> Optional[Tuple[int, int, int]]:
+        p = f"v{version}_"
+        width = 32 if version == 4 else 128
+        hi, lo, plen = self._s[p + "hi"], self._s[p + "lo"], self._s[p + "plen"]
+        left, right, owner = self._s[p + "left"], self._s[p + "right"], self._s[p + "item"]
+        node = 0
+        best = (0, owner[0]) if owner[0] != -1 else None
+        while plen[node] < width:
+            bit = (key >> (width - 1 - plen[node])) & 1
+            child = right[node] if bit else left[node]
+            if child == -1:
+                break
+            length = plen[child]
+            child_key = (hi[child] << 64) | lo[child]
+            if length and (child_key ^ key) >> (width - length):
+                break
+            node = child
+            if owner[node] != -1:
+                best = (length, owner[node])
+        return (best[0], width, best[1]) if best else None
+
+    def network(self, *addresses: Any) -> Optional[Tuple[Dict[str, Any], int, int]]:
+        best: Optional[Tuple[int, int, int]] = None
+        for addr in addresses:
+            if not addr or not isinstance(addr, str):
+                continue
+            try:
+                ip = ipaddress.ip_address(addr.strip())
+            except ValueError:
+                continue
+            hit = self._longest_prefix(ip.version, int(ip))
+            if hit is None:
+                continue
+            plen, bits, owner = hit
+            if best is None or plen * best[1] > best[0] * bits or (plen * best[1] == best[0] * bits and owner < best[2]):
+                best = (plen, bits, owner)
+        return (self.item(best[2]), best[0], best[1]) if best else None
+
+
+def open_snapshot(path: str) -> Optional[SnapshotIndex]:
+    """Open `path` if it holds a valid snapshot; returns None otherwise."""
+    if not path or not os.path.exists(path):
+        return None
+    started = time.time()
+    try:
+        snap = SnapshotIndex(path)
+    except (OSError, ValueError, KeyError) as exc:
+        logger.warning("Ignoring unreadable CTI snapshot %s: %s", path, exc)
+        return None
+    logger.info("Opened CTI snapshot %s: %d items (%.1fms)", path, len(snap), (time.time() - started) * 1000)
+    return snap
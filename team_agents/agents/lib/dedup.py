@@ -0,0 +1,135 @@
+"""
+dedup.py — fixed-memory, time-windowed duplicate detection for event fingerprints.
+
+Contains:
+ - RotatingBloomFilter: ring of Bloom filters, one per time slice of the window
+
+The window is split into `slices` equal slices, each with its own Bloom
+filter sized for `capacity / slices` keys at `fp_rate`. A key is "seen" if
+any slice still inside the window contains it; new keys go into the current
+slice. When time moves past a slice, its filter is replaced by an empty one,
+so memory is fixed (slices * bits bytes) and old keys expire without any
+per-key bookkeeping.
+
+No lock is taken: bits are stored one per byte, so concurrent writers only
+ever store 1s, and rotation swaps in a fresh array instead of clearing in
+place. A write racing a rotation can be lost, which at worst lets one
+duplicate through at a slice boundary. False positives (a new event judged
+a duplicate) happen at roughly `fp_rate`.
+"""
+from __future__ import annotations
+
+import hashlib
+import math
+import time
+from typing import Callable, Iterable, List
+
+import numpy as np
+
+
+class RotatingBloomFilter:
+    def __init__(
+        self,
+        window_seconds: float = 60,
+        capacity: int = 200_000,
+        fp_rate: float = 0.001,
+        slices: int = 4,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if window_seconds <= 0 or capacity <= 0 or slices <= 0:
+            raise ValueError("window_seconds, capacity and slices must be positive")
+        if not 0 < fp_rate < 1:
+            raise ValueError("fp_rate must be between 0 and 1")
+        self.window_seconds = float(window_seconds)
+        self.slices = int(slices)
+        self.fp_rate = fp_rate
+        self.slice_seconds = self.window_seconds / self.slices
+        per_slice = max(1, math.ceil(capacity / self.slices))
+        # the lookup ORs `slices` filters, so each gets a share of the target rate
+        target = fp_rate / self.slices
+        self.bits = max(64, math.ceil(-per_slice * math.log(target) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.bits / per_slice * math.log(2)))
+        self._clock = clock
+        self._filters: List[np.ndarray] = [np.zeros(self.bits, dtype=np.bool_) for _ in range(self.slices)]
+        self._epochs: List[int] = [-1] * self.slices
+        self.checked = 0
+        self.duplicates = 0
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(f.nbytes for f in self._filters)
+
+    @property
+    def dedup_ratio(self) -> float:
+        return self.duplicates / self.checked if self.checked else 0.0
+
+    def fill_ratio(self) -> float:
+        """Share of set bits in the current slice; above ~0.5 the fp rate degrades."""
+        slot = self._rotate(self._epoch())
+        return float(np.count_nonzero(self._filters[slot])) / self.bits
+
+    def _epoch(self) -> int:
+        return int(self._clock() // self.slice_seconds)
+
+    def _rotate(self, epoch: int) -> int:
+        slot = epoch % self.slices
+        if self._epochs[slot] != epoch:
+            # swap in a fresh filter rather than clearing the one readers may hold
+            self._filters[slot] = np.zeros(self.bits, dtype=np.bool_)
+            self._epochs[slot] = epoch
+        return slot
+
+    def _positions(self, keys: List[str]) -> np.ndarray:
+        # double hashing: position_i = h1 + i * h2 (mod bits), from one 128-bit digest per key
+        digests = b"".join(hashlib.blake2b(k.encode("utf-8"), digest_size=16).digest() for k in keys)
+        pairs = np.frombuffer(digests, dtype=np.uint64).reshape(len(keys), 2)
+        steps = np.arange(self.hashes, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            combined = pairs[:, :1] + steps[None, :] * (pairs[:, 1:] | np.uint64(1))
+        return (combined % np.uint64(self.bits)).astype(np.int64)
+
+    def seen_many(self, keys: Iterable[str], add: bool = True) -> np.ndarray:
+        """
+        Boolean array, True where the key was already seen inside the window
+        (or earlier in this same call). With add=True, unseen keys are recorded.
+        """
+        keys = list(keys)
+        if not keys:
+            return np.zeros(0, dtype=np.bool_)
+        epoch = self._epoch()
+        current = self._rotate(epoch)
+        positions = self._positions(keys)
+        seen = np.zeros(len(keys), dtype=np.bool_)
+        oldest = epoch - self.slices + 1
+        for slot in range(self.slices):
+            if self._epochs[slot] >= oldest:
+                seen |= self._filters[slot][positions].all(axis=1)
+        # duplicates within the batch itself
+        first = {}
+        for i, key in enumerate(keys):
+            if first.setdefault(key, i) != i:
+                seen[i] = True
+        if add:
+            self._filters[current][positions[~seen].ravel()] = True
+            self.checked += len(keys)
+            self.duplicates += int(seen.sum())
+        return seen
+
+    def seen(self, key: str, add: bool = True) -> bool:
+        return bool(self.seen_many([key], add=add)[0])
+
+    def add(self, key: str) -> None:
+        self.seen_many([key], add=True)
+
+    def __contains__(self, key: str) -> bool:
+        return self.seen(key, add=False)
+
+    def stats(self) -> dict:
+        return {
+            "memory_bytes": self.memory_bytes,
+            "bits_per_slice": self.bits,
+            "hashes": self.hashes,
+            "dedup_ratio": self.dedup_ratio,
+            "fill_ratio": self.fill_ratio(),
+        }
+
@@ -0,0 +1,270 @@
+"""
+feed_manager.py — stale-while-revalidate CTI feed holder.
+
+Contains:
+ - FeedSnapshot: immutable view of one feed refresh (items + compiled index)
+ - FeedManager: serves the last good snapshot and refreshes it in the background
+
+Refreshes run on a daemon thread and are single-flight: however many hunts
+notice the feed is due, only one fetch is in progress at a time and every
+waiter shares its result. Only the very first request of a process (no
+snapshot yet) waits for the network.
+
+Refreshes are incremental: validators (ETag / Last-Modified / cursor) from
+the previous sync are sent back, a 304 only bumps the snapshot timestamp,
+and added / removed indicators are applied to a copy of the index. Readers
+never see an index change under them: the copy is published together with
+its items by replacing the snapshot reference. A full payload with no items
+is treated as a failed fetch and the last good snapshot stays in place.
+
+Items are keyed by id (by content digest when they have none). Every item
+is held and indexed under that one key, so a repeated key keeps only its
+last version, both in the live items and in the index.
+
+When a snapshot path is configured, every content change is persisted with
+cti_snapshot.write_snapshot and new processes start from the mapped file
+instead of the network. Once the mapped index has been replaced, its mapping
+is closed at the start of the next refresh, after hunts that were still
+reading the old snapshot have finished with it.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from team_agents.agents.lib.cti_snapshot import SnapshotIndex, open_snapshot, write_snapshot
+from team_agents.agents.lib.indicator_index import IndicatorIndex
+from team_agents.agents.lib.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class FeedSnapshot:
+    items: Sequence[Dict[str, Any]]
+    index: Any  # IndicatorIndex, or a read-only SnapshotIndex after a warm start
+    fetched_at: float = field(default_factory=time.time)
+
+
+Held = Dict[str, Tuple[int, Dict[str, Any]]]
+
+
+def _item_key(item: Dict[str, Any]) -> str:
+    key = item.get("id")
+    if key is not None:
+        return str(key)
+    # id-less items are keyed by content so an unchanged one keeps its key across syncs
+    text = json.dumps(item, sort_keys=True, separators=(",", ":"), default=str)
+    return "#" + hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _keyed(items: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Items by key in feed order; a repeated key keeps its last version."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for item in items:
+        out[_item_key(item)] = item
+    return out
+
+
+def _build(items: Iterable[Dict[str, Any]]) -> Tuple[Held, IndicatorIndex]:
+    keyed = _keyed(items)
+    index = IndicatorIndex(keyed.values())
+    # the index numbers items in insertion order, starting at 0
+    return {key: (pos, item) for pos, (key, item) in enumerate(keyed.items())}, index
+
+
+def _normalize_items(raw: Iterable[Any]) -> List[Dict[str, Any]]:
+    # pydantic objects may be returned by the fetcher
+    items: List[Dict[str, Any]] = []
+    for it in raw:
+        try:
+            items.append(it.dict() if hasattr(it, "dict") else dict(it))
+        except Exception:
+            continue
+    return items
+
+
+class FeedManager:
+    def __init__(
+        self,
+        fetch_delta: Callable[..., Any],
+        ttl: float = 300,
+        refresh_ahead: float = 0.8,
+        retry_seconds: float = 30,
+        snapshot_path: Optional[str] = None,
+    ) -> None:
+        self._fetch_delta = fetch_delta
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.retry_seconds = retry_seconds
+        self.snapshot_path = snapshot_path
+        self._warm_checked = False
+        self._lock = threading.Lock()
+        self._snapshot: Optional[FeedSnapshot] = None
+        self._inflight: Optional[Future] = None
+        self._not_before = 0.0
+        self._retired: Optional[SnapshotIndex] = None
+        # item key -> (index position, item) for the live feed, plus sync validators
+        self._held: Held = {}
+        self._validators: Dict[str, Optional[str]] = {"etag": None, "last_modified": None, "cursor": None}
+
+    def configure(self, ttl: Optional[float] = None, refresh_ahead: Optional[float] = None,
+                  retry_seconds: Optional[float] = None, snapshot_path: Optional[str] = None) -> None:
+        if ttl is not None:
+            self.ttl = ttl
+        if refresh_ahead is not None:
+            self.refresh_ahead = refresh_ahead
+        if retry_seconds is not None:
+            self.retry_seconds = retry_seconds
+        if snapshot_path is not None:
+            self.snapshot_path = snapshot_path
+
+    def snapshot(self) -> Optional[FeedSnapshot]:
+        return self._snapshot
+
+    def refresh(self) -> Future:
+        """Start a background refresh, or join the one already in flight."""
+        with self._lock:
+            # the slot stays taken until any snapshot write finishes, so the held
+            # items are not replaced while they are being serialised
+            if self._inflight is not None:
+                metrics.incr("intel.feed_refresh_joined", 1)
+                return self._inflight
+            fut: Future = Future()
+            self._inflight = fut
+        threading.Thread(target=self._run, args=(fut,), name="cti-feed-refresh", daemon=True).start()
+        return fut
+
+    async def get(self) -> FeedSnapshot:
+        """Return the current snapshot, scheduling a refresh when it is due."""
+        snap = self._snapshot
+        if snap is None and not self._warm_checked:
+            snap = self._warm_start()
+        if snap is None:
+            # cold start: all callers share the single in-flight fetch
+            return await asyncio.wrap_future(self.refresh())
+        now = time.time()
+        age = now - snap.fetched_at
+        # an empty snapshot (failed cold start) is retried after retry_seconds
+        due = age >= self.ttl * self.refresh_ahead or not snap.items
+        if due and now >= self._not_before:
+            self.refresh()
+        if age >= self.ttl:
+            metrics.incr("intel.feed_stale_served", 1)
+        return snap
+
+    def _warm_start(self) -> Optional[FeedSnapshot]:
+        """Adopt the on-disk snapshot, if any, as the current feed (no network)."""
+        with self._lock:
+            if self._warm_checked:
+                return self._snapshot
+            self._warm_checked = True
+            mapped = open_snapshot(self.snapshot_path) if self.snapshot_path else None
+            if mapped is None:
+                return None
+            meta = mapped.meta
+            self._validators = {k: meta.get(k) for k in self._validators}
+            self._snapshot = FeedSnapshot(items=mapped.items, index=mapped, fetched_at=float(meta.get("fetched_at") or 0))
+            metrics.incr("intel.feed_warm_starts", 1)
+            return self._snapshot
+
+    def _run(self, fut: Future) -> None:
+        try:
+            snap, changed = self._refresh_sync()
+            # release waiters first; persisting is off the critical path
+            fut.set_result(snap)
+            if changed and self.snapshot_path:
+                self._persist(snap)
+        except Exception as exc:
+            logger.exception("CTI feed refresh failed: %s", exc)
+            metrics.incr("intel.feed_refresh_errors", 1)
+            self._not_before = time.time() + self.retry_seconds
+            if self._snapshot is None:
+                # serve an empty feed rather than failing every hunt until the next retry
+                self._snapshot = FeedSnapshot(items=[], index=IndicatorIndex())
+            if not fut.done():
+                fut.set_result(self._snapshot)
+        finally:
+            with self._lock:
+                self._inflight = None
+
+    def _refresh_sync(self) -> Tuple[FeedSnapshot, bool]:
+        started = time.time()
+        if self._retired is not None:
+            self._retired.close()
+            self._retired = None
+        previous = self._snapshot
+        delta = self._fetch_delta(**self._validators)
+        if delta.not_modified and previous is not None:
+            # nothing changed upstream: skip parsing and indexing entirely
+            snap = FeedSnapshot(items=previous.items, index=previous.index, fetched_at=time.time())
+            metrics.incr("intel.feed_not_modified", 1)
+        else:
+            added = _normalize_items(delta.added)
+            if delta.full and not added and previous is not None and previous.items:
+                # an empty full payload is far more likely a broken feed than a cleared one
+                logger.warning("CTI refresh returned no items; keeping last good snapshot")
+                metrics.incr("intel.feed_refresh_empty", 1)
+                self._not_before = time.time() + self.retry_seconds
+                return previous, False
+            if previous is None:
+                held, index = _build(added)
+            else:
+                held, index = self._apply(previous, added, delta.removed, replace=delta.full)
+            snap = FeedSnapshot(items=[item for _, item in held.values()], index=index, fetched_at=time.time())
+            self._held = held
+            if previous is not None and isinstance(previous.index, SnapshotIndex):
+                # hunts may still hold the mapped snapshot; close it on the next refresh
+                self._retired = previous.index
+            metrics.incr("intel.feed_refreshed", 1)
+            logger.info("CTI feed synced (%s): %d added, %d removed, %d live items",
+                        "full" if delta.full else "delta", len(added), len(delta.removed), len(snap.items))
+        self._validators = {"etag": delta.etag, "last_modified": delta.last_modified, "cursor": delta.cursor}
+        self._snapshot = snap
+        self._not_before = time.time() + (self.retry_seconds if not snap.items else 0)
+        metrics.timing("intel.feed_refresh_seconds", time.time() - started)
+        return snap, not delta.not_modified
+
+    def _persist(self, snap: FeedSnapshot) -> None:
+        started = time.time()
+        try:
+            meta = dict(self._validators, fetched_at=snap.fetched_at)
+            size = write_snapshot(self.snapshot_path, list(self._held.values()), snap.index, meta)
+        except Exception as exc:
+            logger.warning("Failed to persist CTI snapshot to %s: %s", self.snapshot_path, exc)
+            metrics.incr("intel.snapshot_errors", 1)
+            return
+        metrics.timing("intel.snapshot_write_seconds", time.time() - started)
+        logger.info("Persisted CTI snapshot %s (%d bytes)", self.snapshot_path, size)
+
+    def _apply(self, previous: FeedSnapshot, added: List[Dict[str, Any]], removed: Iterable[str],
+               replace: bool) -> Tuple[Held, IndicatorIndex]:
+        """
+        Fold a change set into copies of the live items and index (a full payload
+        is diffed against them first); the caller publishes both at once.
+        """
+        if isinstance(previous.index, SnapshotIndex):
+            # first change after a warm start: materialise a mutable index
+            held, index = _build(previous.items)
+        else:
+            held, index = dict(self._held), previous.index.copy()
+        incoming = _keyed(added)
+        drop = set(removed)
+        if replace:
+            drop.update(key for key in held if key not in incoming)
+        changed = [(key, item) for key, item in incoming.items() if key not in held or held[key][1] != item]
+        drop.update(key for key, _ in changed if key in held)
+        gone = [held.pop(key) for key in drop if key in held]
+        positions = index.apply([item for _, item in changed], gone)
+        for (key, item), pos in zip(changed, positions):
+            held[key] = (pos, item)
+        metrics.incr("intel.feed_delta_added", len(changed))
+        metrics.incr("intel.feed_delta_removed", len(gone))
+        return held, index
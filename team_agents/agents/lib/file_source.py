@@ -0,0 +1,172 @@
+"""
+file_source.py — memory-mapped JSONL / NDJSON file source with resumable offsets.
+
+Contains:
+ - JsonlFileSource: reads a (possibly multi-GB) JSONL export through mmap in
+   line-aligned chunks, optionally parsing chunks in a process pool, and
+   checkpoints the byte offset of fully processed chunks
+
+Chunks are cut on newline boundaries by searching the mapping directly, so
+lines are never split or copied before parsing; each chunk is copied once,
+by the parser. With a process pool, workers map the file themselves and only
+(start, end) offsets cross the process boundary.
+
+The checkpoint ({"offset", "size", "inode"}) is written atomically by
+commit(). Readers never commit themselves: read_batch() and aiter_chunks()
+return end offsets and the caller commits one once everything before it has
+been processed, so an interrupted run resumes at the first unprocessed chunk
+(at-least-once for the chunks in flight). Callers sharing a source hold
+`lock` from read to commit. If the file was replaced or truncated, reading
+starts again from the beginning.
+
+An unterminated last line may still be being written, so it is left for a
+later read unless the caller passes final=True (the file is complete).
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import mmap
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from team_agents.agents.lib.event_batch import parse_ndjson
+
+logger = logging.getLogger(__name__)
+
+Range = Tuple[int, int]
+
+
+def _parse_range(path: str, start: int, end: int) -> List[Dict[str, Any]]:
+    """Parse bytes [start, end) of a JSONL file; runs in worker processes too."""
+    with open(path, "rb") as fh:
+        if end <= start:
+            return []
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return parse_ndjson(mm[start:end])
+
+
+class JsonlFileSource:
+    def __init__(
+        self,
+        path: str,
+        checkpoint_path: Optional[str] = None,
+        chunk_bytes: int = 4 << 20,
+        workers: int = 0,
+    ) -> None:
+        self.path = path
+        self.checkpoint_path = checkpoint_path or f"{path}.offset"
+        self.chunk_bytes = max(1, int(chunk_bytes))
+        self.workers = max(0, int(workers))
+        self.offset = self._load_checkpoint()
+        # serialises read_batch() + commit() across concurrent consumers
+        self.lock = threading.Lock()
+
+    # ---- checkpoints ----
+    def _identity(self) -> Tuple[int, int]:
+        st = os.stat(self.path)
+        return st.st_size, st.st_ino
+
+    def _load_checkpoint(self) -> int:
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+            size, inode = self._identity()
+            offset = int(data.get("offset", 0))
+            if data.get("inode") != inode or offset > size:
+                logger.info("File source %s was replaced or truncated; restarting from 0", self.path)
+                return 0
+            return offset
+        except FileNotFoundError:
+            return 0
+        except Exception as exc:
+            logger.warning("Ignoring unreadable checkpoint %s: %s", self.checkpoint_path, exc)
+            return 0
+
+    def commit(self, offset: int) -> None:
+        """Record that everything before `offset` has been delivered."""
+        self.offset = offset
+        size, inode = self._identity()
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"offset": offset, "size": size, "inode": inode}, fh)
+        os.replace(tmp, self.checkpoint_path)
+
+    def reset(self) -> None:
+        self.commit(0)
+
+    # ---- chunking ----
+    def ranges(self, start: Optional[int] = None, max_lines: Optional[int] = None,
+               final: bool = False) -> Iterator[Range]:
+        """
+        Yield line-aligned byte ranges from `start` (default: the checkpoint) to
+        the last newline, or to EOF when `final` (unterminated last line included).
+        """
+        pos = self.offset if start is None else start
+        with open(self.path, "rb") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            if size == 0 or pos >= size:
+                return
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                while pos < size:
+                    if max_lines:
+                        end = pos
+                        for _ in range(max_lines):
+                            nl = mm.find(b"\n", end, min(size, pos + self.chunk_bytes))
+                            if nl < 0:
+                                break
+                            end = nl + 1
+                    else:
+                        end = mm.rfind(b"\n", pos, min(size, pos + self.chunk_bytes)) + 1
+                    if end <= pos:
+                        # a single line longer than chunk_bytes (or the unterminated last line)
+                        nl = mm.find(b"\n", pos)
+                        if nl < 0 and not final:
+                            return  # possibly still being appended to
+                        end = size if nl < 0 else nl + 1
+                    yield pos, end
+                    pos = end
+
+    # ---- reading ----
+    def read_batch(self, max_events: int) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Next slice of at most `max_events` lines from the checkpoint and the offset
+        it ends at. Nothing is committed; call commit(end) once the events were processed.
+        """
+        for start, end in self.ranges(max_lines=max_events):
+            return _parse_range(self.path, start, end), end
+        return [], self.offset
+
+    async def aiter_chunks(self, final: bool = False) -> AsyncIterator[Tuple[List[Dict[str, Any]], int]]:
+        """
+        Parsed chunks from the checkpoint to EOF, in file order, with the offset
+        each one ends at; parsing runs off the event loop (in the process pool
+        when `workers` is set). Nothing is committed: the caller commits an end
+        offset once every event before it has been processed.
+        """
+        loop = asyncio.get_running_loop()
+        pool: Optional[Executor] = ProcessPoolExecutor(max_workers=self.workers) if self.workers else None
+        try:
+            pending: List[Tuple[int, "asyncio.Future[List[Dict[str, Any]]]"]] = []
+            ranges = self.ranges(final=final)
+            depth = max(1, self.workers * 2)
+            exhausted = False
+            while True:
+                # keep a bounded number of chunks parsing ahead; deliver in file order
+                while not exhausted and len(pending) < depth:
+                    nxt = next(ranges, None)
+                    if nxt is None:
+                        exhausted = True
+                        break
+                    start, end = nxt
+                    pending.append((end, loop.run_in_executor(pool, _parse_range, self.path, start, end)))
+                if not pending:
+                    return
+                end, fut = pending.pop(0)
+                yield await fut, end
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,226 @@
+"""
+incident_store.py — persistent cross-hunt incident store (SQLite).
+
+Contains:
+ - incident_digest(): content digest of an incident's compact projection
+ - IncidentStore: upserts the correlator's incidents into open incidents
+   that share an entity within the merge window, and tracks which content
+   has already been handled downstream (story + SOAR)
+ - incident_store(): process-wide store configured from correlator.*
+
+Tables: incidents (one row per incident, indexed by last_seen),
+incident_entities (entity -> incident, indexed by (entity, last_seen)) and
+incident_alerts (alert ids per incident, so an alert seen again in a later
+hunt is not counted twice). Finding the incidents to merge into is an
+indexed range lookup per entity, O(log n) in the number of stored rows.
+
+An upsert that touches several stored incidents merges them into the
+oldest one. After a merge the digest is recomputed. `changed` is True when
+that digest differs from the last one marked handled, so a hunt that only
+re-reports known alerts produces no new story or SOAR call. prune() drops
+incidents last seen before a cutoff; the correlator calls it after every
+upsert batch with correlator.retention_seconds.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from team_agents.agents.lib.config import get_config
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS incidents ("
+    " id TEXT PRIMARY KEY, severity REAL NOT NULL, alert_count INTEGER NOT NULL,"
+    " first_seen REAL NOT NULL, last_seen REAL NOT NULL, created_at REAL NOT NULL,"
+    " updated_at REAL NOT NULL, digest TEXT NOT NULL, handled_digest TEXT)",
+    "CREATE INDEX IF NOT EXISTS incidents_last_seen ON incidents (last_seen)",
+    "CREATE TABLE IF NOT EXISTS incident_entities ("
+    " entity TEXT NOT NULL, incident_id TEXT NOT NULL, last_seen REAL NOT NULL,"
+    " PRIMARY KEY (entity, incident_id))",
+    "CREATE INDEX IF NOT EXISTS incident_entities_seen ON incident_entities (entity, last_seen)",
+    "CREATE INDEX IF NOT EXISTS incident_entities_incident ON incident_entities (incident_id)",
+    "CREATE TABLE IF NOT EXISTS incident_alerts ("
+    " incident_id TEXT NOT NULL, alert_id TEXT NOT NULL, PRIMARY KEY (incident_id, alert_id))",
+)
+
+# projection fields that define an incident's content (ids and bookkeeping times excluded)
+DIGEST_FIELDS = ("severity", "alert_count", "entities", "first_seen", "last_seen")
+
+
+def incident_digest(incident: Mapping[str, Any], fields: Optional[Sequence[str]] = DIGEST_FIELDS) -> str:
+    """blake2b of the canonical JSON of `fields` (all of them when fields is None)."""
+    view = dict(incident) if fields is None else {k: incident.get(k) for k in fields}
+    text = json.dumps(view, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class IncidentStore:
+    def __init__(self, path: str, window_seconds: float = 3600) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.window_seconds = float(window_seconds)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            for stmt in _SCHEMA:
+                self._conn.execute(stmt)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ---- lookups ----
+    def _matching(self, entities: Sequence[str], first_seen: float) -> List[str]:
+        """Incidents sharing an entity that was active inside the window, oldest first."""
+        if not entities:
+            return []
+        since = first_seen - self.window_seconds
+        found: Dict[str, float] = {}
+        for i in range(0, len(entities), 500):
+            chunk = list(entities[i:i + 500])
+            marks = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT DISTINCT i.id, i.created_at FROM incident_entities e JOIN incidents i ON i.id = e.incident_id"
+                f" WHERE e.entity IN ({marks}) AND e.last_seen >= ?",
+                [*chunk, since],
+            ).fetchall()
+            found.update(rows)
+        return sorted(found, key=found.__getitem__)
+
+    def get(self, incident_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._load(incident_id)
+
+    def _load(self, incident_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            "SELECT id, severity, alert_count, first_seen, last_seen, created_at, updated_at, digest, handled_digest"
+            " FROM incidents WHERE id = ?", (incident_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "severity", "alert_count", "first_seen", "last_seen", "created_at", "updated_at", "digest", "handled_digest")
+        out = dict(zip(keys, row))
+        out["entities"] = [e for (e,) in self._conn.execute(
+            "SELECT entity FROM incident_entities WHERE incident_id = ? ORDER BY entity", (incident_id,))]
+        out["changed"] = out["digest"] != out["handled_digest"]
+        return out
+
+    # ---- writes ----
+    def _absorb(self, keep: str, others: Sequence[str]) -> None:
+        """Fold `others` into `keep` (alerts, entities, severity and time range)."""
+        for other in others:
+            self._conn.execute("UPDATE OR IGNORE incident_alerts SET incident_id = ? WHERE incident_id = ?", (keep, other))
+            self._conn.execute(
+                "INSERT INTO incident_entities (entity, incident_id, last_seen)"
+                " SELECT entity, ?, last_seen FROM incident_entities WHERE incident_id = ? AND true"
+                " ON CONFLICT (entity, incident_id) DO UPDATE SET last_seen = max(last_seen, excluded.last_seen)",
+                (keep, other),
+            )
+            row = self._conn.execute(
+                "SELECT severity, first_seen, last_seen, created_at FROM incidents WHERE id = ?", (other,)).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE incidents SET severity = max(severity, ?), first_seen = min(first_seen, ?),"
+                    " last_seen = max(last_seen, ?), created_at = min(created_at, ?) WHERE id = ?",
+                    (*row, keep),
+                )
+            for table, col in (("incident_alerts", "incident_id"), ("incident_entities", "incident_id"), ("incidents", "id")):
+                self._conn.execute(f"DELETE FROM {table} WHERE {col} = ?", (other,))
+
+    def upsert(self, incident: Mapping[str, Any]) -> Dict[str, Any]:
+        """
+        Merge one correlated group (entities, alerts, severity, first/last seen)
+        into the store and return the stored incident, with `changed` set when
+        its content differs from what was last handled.
+        """
+        entities = sorted(set(incident.get("entities") or []))
+        alert_ids = [str(a.get("id")) for a in incident.get("alerts") or [] if a.get("id") is not None]
+        first_seen = float(incident.get("first_seen") or time.time())
+        last_seen = float(incident.get("last_seen") or first_seen)
+        severity = float(incident.get("severity") or 0)
+        now = time.time()
+        with self._lock, self._conn:
+            existing = self._matching(entities, first_seen)
+            if existing:
+                incident_id = existing[0]
+                self._absorb(incident_id, existing[1:])
+                self._conn.execute(
+                    "UPDATE incidents SET severity = max(severity, ?), first_seen = min(first_seen, ?),"
+                    " last_seen = max(last_seen, ?) WHERE id = ?",
+                    (severity, first_seen, last_seen, incident_id),
+                )
+            else:
+                incident_id = f"incident:{uuid.uuid4().hex[:8]}"
+                self._conn.execute(
+                    "INSERT INTO incidents (id, severity, alert_count, first_seen, last_seen, created_at, updated_at, digest)"
+                    " VALUES (?, ?, 0, ?, ?, ?, ?, '')",
+                    (incident_id, severity, first_seen, last_seen, now, now),
+                )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO incident_alerts (incident_id, alert_id) VALUES (?, ?)",
+                [(incident_id, aid) for aid in alert_ids],
+            )
+            self._conn.executemany(
+                "INSERT INTO incident_entities (entity, incident_id, last_seen) VALUES (?, ?, ?)"
+                " ON CONFLICT (entity, incident_id) DO UPDATE SET last_seen = max(last_seen, excluded.last_seen)",
+                [(e, incident_id, last_seen) for e in entities],
+            )
+            (count,) = self._conn.execute(
+                "SELECT count(*) FROM incident_alerts WHERE incident_id = ?", (incident_id,)).fetchone()
+            self._conn.execute("UPDATE incidents SET alert_count = ? WHERE id = ?", (count, incident_id))
+            stored = self._load(incident_id)
+            digest = incident_digest(stored)
+            if digest != stored["digest"]:
+                self._conn.execute("UPDATE incidents SET digest = ?, updated_at = ? WHERE id = ?", (digest, now, incident_id))
+                stored.update(digest=digest, updated_at=now)
+            stored["changed"] = stored["digest"] != stored["handled_digest"]
+            stored["merged"] = len(existing)
+            return stored
+
+    def mark_handled(self, incident_id: str, digest: str) -> None:
+        """Record that downstream work (story, SOAR) covered this content of the incident."""
+        self.mark_handled_many([(incident_id, digest)])
+
+    def mark_handled_many(self, handled: Sequence[Tuple[str, str]]) -> None:
+        """mark_handled() for several (incident id, digest) pairs in one transaction."""
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE incidents SET handled_digest = ? WHERE id = ?",
+                                   [(digest, incident_id) for incident_id, digest in handled])
+
+    def prune(self, older_than: float) -> int:
+        """Delete incidents last seen before `older_than`; returns how many."""
+        with self._lock, self._conn:
+            ids = [i for (i,) in self._conn.execute("SELECT id FROM incidents WHERE last_seen < ?", (older_than,))]
+            for table, col in (("incident_alerts", "incident_id"), ("incident_entities", "incident_id"), ("incidents", "id")):
+                self._conn.executemany(f"DELETE FROM {table} WHERE {col} = ?", [(i,) for i in ids])
+        return len(ids)
+
+
+_store: Optional[IncidentStore] = None
+
+
+def incident_store() -> Optional[IncidentStore]:
+    """The configured store, or None when correlator.store_path is empty or unusable."""
+    global _store
+    if _store is None:
+        path = get_config("correlator.store_path") or ""
+        if not path:
+            return None
+        try:
+            _store = IncidentStore(path, window_seconds=float(get_config("correlator.window_seconds", 3600)))
+        except sqlite3.Error as exc:
+            logger.warning("Incident store disabled (%s): %s", path, exc)
+            return None
+    return _store
@@ -0,0 +1,301 @@
+"""
+indicator_index.py — compiled CTI indicator index used by the intel agent.
+
+Contains:
+ - AhoCorasick: multi-pattern substring automaton (pure Python)
+ - IndicatorIndex: exact-value dict + substring automaton + CIDR trie built once per feed refresh
+
+Lookups preserve feed order: when several indicators match an event, the one
+that appears first in the feed wins, exactly like the previous linear scans.
+"""
+from __future__ import annotations
+
+import logging
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from team_agents.agents.lib.ip_trie import IPPrefixTrie, is_network_item, networks_from_attributes
+
+logger = logging.getLogger(__name__)
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton over a fixed set of patterns.
+
+    Nodes are stored in parallel lists (goto / fail / pattern / dict_link) so a
+    search touches each character of the text once, independent of how many
+    patterns were compiled.
+    """
+
+    def __init__(self, patterns: Iterable[str] = ()) -> None:
+        self.patterns: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._pattern: List[int] = [-1]
+        self._dict_link: List[int] = [-1]
+        for p in patterns:
+            self._add(p)
+        self._link()
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def _add(self, pattern: str) -> None:
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._pattern.append(-1)
+                self._dict_link.append(-1)
+                self._goto[node][ch] = nxt
+            node = nxt
+        if self._pattern[node] == -1:
+            self._pattern[node] = len(self.patterns)
+            self.patterns.append(pattern)
+
+    def _link(self) -> None:
+        # breadth-first pass computing failure and output (dictionary suffix) links
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                fail = self._fail[child]
+                self._dict_link[child] = fail if self._pattern[fail] != -1 else self._dict_link[fail]
+
+    def flatten(self) -> Tuple[List[int], List[int], List[int], List[List[Tuple[int, int]]]]:
+        """Return (fail, pattern, dict_link, sorted (codepoint, child) edges) per node for serialisation."""
+        edges = [sorted((ord(ch), child) for ch, child in goto.items()) for goto in self._goto]
+        return self._fail, self._pattern, self._dict_link, edges
+
+    def iter_matches(self, text: str) -> Iterator[int]:
+        """Yield the id of every pattern occurrence found in `text`."""
+        goto, fail, pattern, dict_link = self._goto, self._fail, self._pattern, self._dict_link
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            out = node if pattern[node] != -1 else dict_link[node]
+            while out != -1:
+                yield pattern[out]
+                out = dict_link[out]
+
+
+def _indicator_value(item: Dict[str, Any]) -> Any:
+    try:
+        return (item.get("attributes") or {}).get("value")
+    except Exception:
+        return None
+
+
+Holder = Tuple[int, Dict[str, Any]]
+
+
+class IndicatorIndex:
+    """
+    Feed compiled for enrichment lookups.
+
+    - exact(): dict lookup keyed by indicator value
+    - fuzzy(): Aho-Corasick pass reporting indicator values contained in the texts
+    - network(): longest-prefix match of addresses against network-type indicators
+
+    The index can be maintained incrementally with add()/remove() (see apply()).
+    Patterns added after construction go into a small pending automaton and
+    removed ones are filtered at lookup; both are folded back into the main
+    automaton once they exceed `compact_ratio` of it. Readers of a published
+    index should not see it change: apply a delta to copy() and publish that.
+    """
+
+    def __init__(self, items: Iterable[Dict[str, Any]] = (), compact_ratio: float = 0.1) -> None:
+        # value / network -> holders as (feed position, item), oldest first
+        self._by_value: Dict[Any, List[Holder]] = {}
+        self._by_network: Dict[Any, List[Holder]] = {}
+        self._networks = IPPrefixTrie()
+        self._size = 0
+        self._next_pos = 0
+        self.compact_ratio = compact_ratio
+        self._compiled: set = set()
+        self._fresh: set = set()
+        for item in items:
+            self._insert(item)
+        self._compile()
+        logger.debug("Indicator index built: %d items, %d patterns, %d prefixes",
+                     self._size, len(self._automaton), len(self._networks))
+
+    def __len__(self) -> int:
+        return self._size
+
+    # -----------------------
+    # Maintenance
+    # -----------------------
+    def _compile(self) -> None:
+        self._automaton = AhoCorasick(v for v in self._by_value if isinstance(v, str))
+        self._compiled = set(self._automaton.patterns)
+        self._pending = AhoCorasick()
+        self._fresh = set()
+        self._dead = 0
+
+    def _insert(self, item: Dict[str, Any]) -> int:
+        pos = self._next_pos
+        self._next_pos += 1
+        self._size += 1
+        holder = (pos, item)
+        if is_network_item(item):
+            for net in networks_from_attributes(item.get("attributes") or {}):
+                holders = self._by_network.get(net)
+                if holders is None:
+                    self._networks.insert(net, net)
+                self._by_network[net] = (holders or []) + [holder]
+        val = _indicator_value(item)
+        if val:
+            try:
+                # lists are replaced rather than mutated so concurrent readers never see partial state
+                self._by_value[val] = self._by_value.get(val, []) + [holder]
+                if isinstance(val, str) and val not in self._compiled:
+                    self._fresh.add(val)
+            except TypeError:
+                # unhashable attribute values can never match an event field
+                pass
+        return pos
+
+    def copy(self) -> "IndicatorIndex":
+        """
+        Independent copy for copy-on-write updates. Holder lists and automata are
+        never mutated once built, so they are shared; the dicts, the pending set
+        and the prefix trie are duplicated.
+        """
+        clone = IndicatorIndex.__new__(IndicatorIndex)
+        clone._by_value = dict(self._by_value)
+        clone._by_network = dict(self._by_network)
+        clone._networks = IPPrefixTrie()
+        for net in self._by_network:
+            clone._networks.insert(net, net)
+        clone._size = self._size
+        clone._next_pos = self._next_pos
+        clone.compact_ratio = self.compact_ratio
+        clone._automaton = self._automaton
+        clone._pending = self._pending
+        clone._compiled = self._compiled
+        clone._fresh = set(self._fresh)
+        clone._dead = self._dead
+        return clone
+
+    def add(self, item: Dict[str, Any]) -> int:
+        """Index one more item (positioned after everything already indexed); returns its position."""
+        return self.apply([item], [])[0]
+
+    def remove(self, pos: int, item: Dict[str, Any]) -> None:
+        self.apply([], [(pos, item)])
+
+    def apply(self, added: Iterable[Dict[str, Any]], removed: Iterable[Holder]) -> List[int]:
+        """Apply a feed delta in place and return the positions assigned to `added`."""
+        for pos, item in removed:
+            self._discard(pos, item)
+        positions = [self._insert(item) for item in added]
+        if len(self._fresh) + self._dead > self.compact_ratio * max(len(self._compiled), 1):
+            self._compile()
+        elif self._fresh != set(self._pending.patterns):
+            self._pending = AhoCorasick(self._fresh)
+        return positions
+
+    def _discard(self, pos: int, item: Dict[str, Any]) -> None:
+        self._size -= 1
+        if is_network_item(item):
+            for net in networks_from_attributes(item.get("attributes") or {}):
+                holders = [h for h in self._by_network.get(net, []) if h[0] != pos]
+                if holders:
+                    self._by_network[net] = holders
+                elif self._by_network.pop(net, None) is not None:
+                    self._networks.remove(net)
+        val = _indicator_value(item)
+        try:
+            current = self._by_value.get(val) if val else None
+        except TypeError:
+            current = None
+        if not current:
+            return
+        holders = [h for h in current if h[0] != pos]
+        if holders:
+            self._by_value[val] = holders
+            return
+        del self._by_value[val]
+        self._fresh.discard(val)
+        if val in self._compiled:
+            self._dead += 1
+
+    def compact(self) -> None:
+        """Fold pending and removed patterns back into the main automaton."""
+        if self._fresh or self._dead:
+            self._compile()
+
+    def export(self) -> Tuple[Dict[str, int], AhoCorasick, IPPrefixTrie, Dict[Any, int]]:
+        """
+        Compacted view for serialisation: first-holder position per string value,
+        the substring automaton, the prefix trie and first-holder position per network.
+        """
+        self.compact()
+        values = {v: h[0][0] for v, h in self._by_value.items() if isinstance(v, str)}
+        networks = {n: h[0][0] for n, h in self._by_network.items()}
+        return values, self._automaton, self._networks, networks
+
+    # -----------------------
+    # Lookups
+    # -----------------------
+    def exact(self, *candidates: Any) -> Optional[Dict[str, Any]]:
+        best: Optional[Holder] = None
+        for c in candidates:
+            if not c:
+                continue
+            try:
+                holders = self._by_value.get(c)
+            except TypeError:
+                continue
+            if holders and (best is None or holders[0][0] < best[0]):
+                best = holders[0]
+        return best[1] if best else None
+
+    def fuzzy(self, *texts: str) -> Optional[Dict[str, Any]]:
+        best: Optional[Holder] = None
+        by_value = self._by_value
+        for automaton in (self._automaton, self._pending):
+            if not len(automaton):
+                continue
+            patterns = automaton.patterns
+            for text in texts:
+                if not text:
+                    continue
+                for pid in automaton.iter_matches(text):
+                    # patterns whose indicators were removed since compilation are skipped
+                    holders = by_value.get(patterns[pid])
+                    if holders and (best is None or holders[0][0] < best[0]):
+                        best = holders[0]
+        return best[1] if best else None
+
+    def network(self, *addresses: Any) -> Optional[Tuple[Dict[str, Any], int, int]]:
+        """Return (item, prefix length, address bits) for the most specific covering prefix."""
+        best: Optional[Tuple[int, int, int, Dict[str, Any]]] = None
+        for addr in addresses:
+            hit = self._networks.lookup(addr)
+            if hit is None:
+                continue
+            plen, bits, net = hit
+            holders = self._by_network.get(net)
+            if not holders:
+                continue
+            pos, item = holders[0]
+            # most specific prefix wins; feed order breaks ties
+            if best is None or plen * best[1] > best[0] * bits or (plen * best[1] == best[0] * bits and pos < best[2]):
+                best = (plen, bits, pos, item)
+        return (best[3], best[0], best[1]) if best else None
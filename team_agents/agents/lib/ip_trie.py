@@ -0,0 +1,238 @@
+"""
+ip_trie.py — compact radix (Patricia) trie for IPv4/IPv6 prefixes.
+
+Contains:
+ - PatriciaTrie: path-compressed binary trie over fixed-width integer keys
+ - IPPrefixTrie: one trie per address family with longest-prefix lookups
+ - networks_from_attributes(): CIDR / range parsing for CTI item attributes
+
+Lookups walk at most one node per address bit, so cost is bounded by 32/128
+steps regardless of how many prefixes were inserted.
+"""
+from __future__ import annotations
+
+import ipaddress
+import logging
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+# CTI item types whose attributes describe addresses, prefixes or ranges
+NETWORK_TYPES = frozenset({
+    "ip", "ipv4", "ipv6", "ipv4-addr", "ipv6-addr",
+    "cidr", "network", "subnet", "ip-range", "ip_range", "netblock",
+})
+
+_ATTRIBUTE_KEYS = ("value", "cidr", "network", "range")
+
+
+class _Node:
+    __slots__ = ("key", "plen", "children", "value")
+
+    def __init__(self, key: int, plen: int, value: Any = None) -> None:
+        self.key = key
+        self.plen = plen
+        self.children: List[Optional["_Node"]] = [None, None]
+        self.value = value
+
+
+class PatriciaTrie:
+    """
+    Path-compressed binary trie keyed by (prefix int, prefix length).
+
+    Only nodes that carry a value or branch are materialised, so memory stays
+    proportional to the number of stored prefixes.
+    """
+
+    def __init__(self, width: int) -> None:
+        self.width = width
+        self._root = _Node(0, 0)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _bit(self, key: int, pos: int) -> int:
+        return (key >> (self.width - 1 - pos)) & 1
+
+    def _common(self, a: int, b: int, limit: int) -> int:
+        diff = a ^ b
+        if not diff:
+            return limit
+        return min(limit, self.width - diff.bit_length())
+
+    def _covers(self, node: _Node, key: int) -> bool:
+        return node.plen == 0 or (node.key ^ key) >> (self.width - node.plen) == 0
+
+    def insert(self, key: int, plen: int, value: Any) -> None:
+        """Store `value` for the prefix; the first value stored for a prefix wins."""
+        key &= ~((1 << (self.width - plen)) - 1) if plen < self.width else -1
+        node = self._root
+        while True:
+            if node.plen == plen:
+                if node.value is None:
+                    node.value = value
+                    self._size += 1
+                return
+            bit = self._bit(key, node.plen)
+            child = node.children[bit]
+            if child is None:
+                node.children[bit] = _Node(key, plen, value)
+                self._size += 1
+                return
+            common = self._common(key, child.key, min(plen, child.plen))
+            if common == child.plen:
+                node = child
+                continue
+            if common == plen:
+                # new prefix sits between node and child
+                fresh = _Node(key, plen, value)
+                fresh.children[self._bit(child.key, plen)] = child
+                node.children[bit] = fresh
+            else:
+                # diverging branch: split at the common prefix
+                split_key = key & ~((1 << (self.width - common)) - 1)
+                split = _Node(split_key, common)
+                split.children[self._bit(key, common)] = _Node(key, plen, value)
+                split.children[self._bit(child.key, common)] = child
+                node.children[bit] = split
+            self._size += 1
+            return
+
+    def remove(self, key: int, plen: int) -> bool:
+        """Drop the value stored for exactly this prefix, pruning empty nodes."""
+        key &= ~((1 << (self.width - plen)) - 1) if plen < self.width else -1
+        path: List[Tuple[_Node, int]] = []
+        node = self._root
+        while node.plen < plen:
+            bit = self._bit(key, node.plen)
+            child = node.children[bit]
+            if child is None or child.plen > plen or not self._covers(child, key):
+                return False
+            path.append((node, bit))
+            node = child
+        if node.plen != plen or node.key != key or node.value is None:
+            return False
+        node.value = None
+        self._size -= 1
+        # splice out nodes that no longer carry a value and branch at most once
+        while path and node.value is None:
+            parent, bit = path.pop()
+            kids = [c for c in node.children if c is not None]
+            if len(kids) > 1:
+                break
+            parent.children[bit] = kids[0] if kids else None
+            node = parent
+        return True
+
+    def flatten(self) -> List[Tuple[int, int, int, int, Any]]:
+        """Return nodes as (key, plen, left, right, value) in preorder; children are list indices or -1."""
+        out: List[List[Any]] = []
+
+        def visit(node: _Node) -> int:
+            idx = len(out)
+            row = [node.key, node.plen, -1, -1, node.value]
+            out.append(row)
+            for side in (0, 1):
+                child = node.children[side]
+                if child is not None:
+                    row[2 + side] = visit(child)
+            return idx
+
+        visit(self._root)
+        return [tuple(row) for row in out]  # type: ignore[misc]
+
+    def longest_prefix(self, key: int) -> Optional[Tuple[int, Any]]:
+        """Return (prefix length, value) of the most specific prefix covering `key`."""
+        node = self._root
+        best = (0, node.value) if node.value is not None else None
+        while node.plen < self.width:
+            child = node.children[self._bit(key, node.plen)]
+            if child is None or not self._covers(child, key):
+                break
+            node = child
+            if node.value is not None:
+                best = (node.plen, node.value)
+        return best
+
+
+class IPPrefixTrie:
+    """Longest-prefix matching over IPv4 and IPv6 networks."""
+
+    def __init__(self) -> None:
+        self._tries = {4: PatriciaTrie(32), 6: PatriciaTrie(128)}
+
+    def __len__(self) -> int:
+        return sum(len(t) for t in self._tries.values())
+
+    def families(self) -> Dict[int, PatriciaTrie]:
+        return dict(self._tries)
+
+    def insert(self, network: IPNetwork, value: Any) -> None:
+        self._tries[network.version].insert(int(network.network_address), network.prefixlen, value)
+
+    def remove(self, network: IPNetwork) -> bool:
+        return self._tries[network.version].remove(int(network.network_address), network.prefixlen)
+
+    def lookup(self, address: Any) -> Optional[Tuple[int, int, Any]]:
+        """Return (prefix length, address bits, value) for the best match of `address`."""
+        if not address or not isinstance(address, str):
+            return None
+        try:
+            ip = ipaddress.ip_address(address.strip())
+        except ValueError:
+            return None
+        trie = self._tries[ip.version]
+        hit = trie.longest_prefix(int(ip))
+        if hit is None:
+            return None
+        return hit[0], trie.width, hit[1]
+
+
+def _parse_range(text: str) -> List[IPNetwork]:
+    start, _, end = text.partition("-")
+    first = ipaddress.ip_address(start.strip())
+    last = ipaddress.ip_address(end.strip())
+    return list(ipaddress.summarize_address_range(first, last))
+
+
+def networks_from_attributes(attributes: Dict[str, Any]) -> List[IPNetwork]:
+    """
+    Extract the networks described by a CTI item's attributes.
+
+    Accepts single addresses, CIDR blocks, "a-b" ranges under the usual keys,
+    and explicit start/end pairs. Unparseable values are ignored.
+    """
+    found: List[IPNetwork] = []
+    for key in _ATTRIBUTE_KEYS:
+        raw = attributes.get(key)
+        if not raw or not isinstance(raw, str):
+            continue
+        try:
+            if "-" in raw and "/" not in raw:
+                found.extend(_parse_range(raw))
+            else:
+                found.append(ipaddress.ip_network(raw.strip(), strict=False))
+        except ValueError:
+            logger.debug("Ignoring unparseable network attribute %s=%r", key, raw)
+    start, end = attributes.get("start"), attributes.get("end")
+    if isinstance(start, str) and isinstance(end, str):
+        try:
+            found.extend(_parse_range(f"{start}-{end}"))
+        except (ValueError, TypeError):
+            logger.debug("Ignoring unparseable network range %r-%r", start, end)
+    # de-duplicate while keeping order
+    seen = set()
+    unique = []
+    for net in found:
+        if net not in seen:
+            seen.add(net)
+            unique.append(net)
+    return unique
+
+
+def is_network_item(item: Dict[str, Any]) -> bool:
+    return str(item.get("type") or "").lower() in NETWORK_TYPES
+
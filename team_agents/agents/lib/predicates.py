@@ -0,0 +1,264 @@
+"""
+predicates.py — compiler for the hypothesis expression language, evaluated as
+vectorized masks over a batch of events.
+
+Contains:
+ - compile_predicate(): parse an expression such as
+   `event == 'login_fail' and (derived_severity >= 2 or indicator_match == true)`
+   into a Predicate (compiled once per expression text, then cached)
+ - Predicate.mask(table): boolean numpy array, one entry per row
+ - EventTable: column view over a list of event dicts or an EventBatch;
+   each column is extracted once and shared by every predicate run on it
+ - PredicateError: raised for expressions outside the language
+
+Language: comparisons `field OP literal` with OP in == != > >= < <=, and
+`field in (lit, ...)`; combined with and / or / not (also && || !) and
+parentheses. Literals are 'strings', "strings", numbers, true, false and
+null. Fields may be dotted (`meta.port`) to reach nested values.
+
+A missing field never matches a comparison, except `field == null` and
+`field != <literal>`. Ordering comparisons need a numeric literal; values
+that are not numbers (booleans included) do not match them.
+"""
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+class PredicateError(ValueError):
+    pass
+
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<str>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+      | (?P<num>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+      | (?P<op>==|!=|>=|<=|>|<|&&|\|\||!|\(|\)|,)
+      | (?P<name>[A-Za-z_@][\w.@]*)
+    )""", re.VERBOSE)
+
+_KEYWORDS = {"and": "&&", "or": "||", "not": "!", "in": "in"}
+_LITERALS = {"true": True, "false": False, "null": None}
+_MISSING = object()
+
+
+def _tokenize(text: str) -> List[Tuple[str, Any]]:
+    tokens: List[Tuple[str, Any]] = []
+    pos, end = 0, len(text.rstrip())
+    while pos < end:
+        m = _TOKEN.match(text, pos)
+        if m is None or m.end() == pos:
+            raise PredicateError(f"unexpected input at {pos}: {text[pos:pos + 20]!r}")
+        pos = m.end()
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == "str":
+            tokens.append(("lit", re.sub(r"\\(.)", r"\1", value[1:-1])))
+        elif kind == "num":
+            num = float(value)
+            tokens.append(("lit", int(num) if num.is_integer() and "." not in value else num))
+        elif kind == "name" and value.lower() in _LITERALS:
+            tokens.append(("lit", _LITERALS[value.lower()]))
+        elif kind == "name" and value.lower() in _KEYWORDS:
+            tokens.append(("op", _KEYWORDS[value.lower()]))
+        else:
+            tokens.append((kind, value))
+    return tokens
+
+
+# ---- parsing: expr := or ; or := and ('||' and)* ; and := unary ('&&' unary)* ;
+#      unary := '!' unary | '(' or ')' | field OP literal | field 'in' '(' literal, ... ')'
+class _Parser:
+    def __init__(self, tokens: List[Tuple[str, Any]]) -> None:
+        self.tokens = tokens
+        self.i = 0
+
+    def _peek(self) -> Tuple[str, Any]:
+        return self.tokens[self.i] if self.i < len(self.tokens) else ("end", None)
+
+    def _take(self, kind: str, value: Any = None) -> Any:
+        tok = self._peek()
+        if tok[0] != kind or (value is not None and tok[1] != value):
+            raise PredicateError(f"expected {value or kind}, got {tok[1]!r}")
+        self.i += 1
+        return tok[1]
+
+    def parse(self) -> tuple:
+        node = self._or()
+        if self._peek()[0] != "end":
+            raise PredicateError(f"unexpected {self._peek()[1]!r}")
+        return node
+
+    def _or(self) -> tuple:
+        node = self._and()
+        while self._peek() == ("op", "||"):
+            self.i += 1
+            node = ("or", node, self._and())
+        return node
+
+    def _and(self) -> tuple:
+        node = self._unary()
+        while self._peek() == ("op", "&&"):
+            self.i += 1
+            node = ("and", node, self._unary())
+        return node
+
+    def _unary(self) -> tuple:
+        tok = self._peek()
+        if tok == ("op", "!"):
+            self.i += 1
+            return ("not", self._unary())
+        if tok == ("op", "("):
+            self.i += 1
+            node = self._or()
+            self._take("op", ")")
+            return node
+        field = self._take("name")
+        op = self._take("op")
+        if op == "in":
+            self._take("op", "(")
+            values = [self._take("lit")]
+            while self._peek() == ("op", ","):
+                self.i += 1
+                values.append(self._take("lit"))
+            self._take("op", ")")
+            return ("in", field, tuple(values))
+        if op not in ("==", "!=", ">", ">=", "<", "<="):
+            raise PredicateError(f"unknown operator {op!r}")
+        value = self._take("lit")
+        if op not in ("==", "!=") and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise PredicateError(f"{op} needs a numeric literal, got {value!r}")
+        return ("cmp", field, op, value)
+
+
+class EventTable:
+    """Columns of a batch of events, extracted lazily and memoized."""
+
+    def __init__(self, rows: Sequence[Any]) -> None:
+        self.rows = rows
+        self._objects: Dict[str, np.ndarray] = {}
+        self._numbers: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def values(self, field: str) -> np.ndarray:
+        """Object array of the field; _MISSING where a row has no such field."""
+        col = self._objects.get(field)
+        if col is None:
+            column = getattr(self.rows, "column", None)
+            if column is not None and "." not in field:
+                data = column(field)
+            elif "." not in field:
+                data = [r.get(field, _MISSING) if isinstance(r, dict) else _MISSING for r in self.rows]
+            else:
+                data = [_lookup(r, field) for r in self.rows]
+            col = np.empty(len(self.rows), dtype=object)
+            col[:] = data
+            self._objects[field] = col
+        return col
+
+    def numbers(self, field: str) -> np.ndarray:
+        """float64 array of the field; NaN where it is missing or not a number (booleans included)."""
+        col = self._numbers.get(field)
+        if col is None:
+            # not raw.astype(np.float64): that reads True/False as 1/0
+            raw = self.values(field)
+            col = np.fromiter((_as_number(v) for v in raw), dtype=np.float64, count=len(raw))
+            self._numbers[field] = col
+        return col
+
+
+def _lookup(row: Any, field: str) -> Any:
+    cur = row
+    for part in field.split("."):
+        if not isinstance(cur, dict) or part not in cur:
+            return _MISSING
+        cur = cur[part]
+    return cur
+
+
+def _as_number(v: Any) -> float:
+    if v is _MISSING or v is None or isinstance(v, (bool, np.bool_)):
+        return np.nan
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _equals(col: np.ndarray, value: Any) -> np.ndarray:
+    if value is None:
+        return (col == None) | (col == _MISSING)  # noqa: E711 (elementwise)
+    if isinstance(value, bool):
+        # True must not match 1, nor 'true' as text
+        return np.fromiter((v is value for v in col), dtype=np.bool_, count=len(col))
+    if isinstance(value, (int, float)):
+        # nor 1 match True
+        return np.fromiter((v == value and not isinstance(v, (bool, np.bool_)) for v in col),
+                           dtype=np.bool_, count=len(col))
+    return np.asarray(col == value, dtype=np.bool_)
+
+
+_Mask = Callable[[EventTable], np.ndarray]
+
+
+def _compile(node: tuple) -> _Mask:
+    kind = node[0]
+    if kind == "and":
+        left, right = _compile(node[1]), _compile(node[2])
+        return lambda t: left(t) & right(t)
+    if kind == "or":
+        left, right = _compile(node[1]), _compile(node[2])
+        return lambda t: left(t) | right(t)
+    if kind == "not":
+        inner = _compile(node[1])
+        return lambda t: ~inner(t)
+    if kind == "in":
+        _, field, values = node
+        return lambda t: np.logical_or.reduce([_equals(t.values(field), v) for v in values])
+    _, field, op, value = node
+    if op == "==":
+        return lambda t: _equals(t.values(field), value)
+    if op == "!=":
+        return lambda t: ~_equals(t.values(field), value)
+    # NaN compares False, so missing and non-numeric values never match
+    cmp = {">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal}[op]
+    return lambda t: cmp(t.numbers(field), value)
+
+
+def _fields(node: tuple) -> Tuple[str, ...]:
+    if node[0] in ("and", "or"):
+        return _fields(node[1]) + _fields(node[2])
+    if node[0] == "not":
+        return _fields(node[1])
+    return (node[1],)
+
+
+class Predicate:
+    __slots__ = ("text", "fields", "_mask")
+
+    def __init__(self, text: str, tree: tuple) -> None:
+        self.text = text
+        self.fields = tuple(dict.fromkeys(_fields(tree)))
+        self._mask = _compile(tree)
+
+    def mask(self, table: EventTable) -> np.ndarray:
+        if len(table) == 0:
+            return np.zeros(0, dtype=np.bool_)
+        return self._mask(table)
+
+    def __repr__(self) -> str:
+        return f"Predicate({self.text!r})"
+
+
+@lru_cache(maxsize=512)
+def compile_predicate(text: str) -> Predicate:
+    tokens = _tokenize(str(text))
+    if not tokens:
+        raise PredicateError("empty expression")
+    return Predicate(text, _Parser(tokens).parse())
@@ -0,0 +1,66 @@
+"""
+query_cache.py — result cache for compiled ESQL queries.
+
+Contains:
+ - normalize_query(): canonical query text (whitespace collapsed outside
+   string literals, trailing ';' dropped)
+ - QueryResultCache: LRU + TTL cache of result pages keyed by
+   (normalized query, time bucket)
+
+The time bucket is int(now // bucket_seconds): hunts in the same bucket
+share results, and a new bucket always goes back to the cluster, so cached
+results are never older than one bucket (or the TTL, whichever is shorter).
+"""
+from __future__ import annotations
+
+import re
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from team_agents.agents.lib.utils import LRUCache, metrics
+
+# quoted literals are kept verbatim; everything else has its whitespace collapsed
+_LITERAL = re.compile(r"('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\")")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    parts = _LITERAL.split(query.strip().rstrip(";").strip())
+    return "".join(p if i % 2 else _SPACE.sub(" ", p) for i, p in enumerate(parts))
+
+
+class QueryResultCache:
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 60,
+        bucket_seconds: float = 60,
+        max_rows: int = 5000,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._cache = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.bucket_seconds = bucket_seconds
+        self.max_rows = max_rows
+        self._clock = clock
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def key(self, query: str) -> Tuple[str, int]:
+        return normalize_query(query), int(self._clock() // self.bucket_seconds)
+
+    def get(self, query: str) -> Optional[List[Any]]:
+        pages = self._cache.get(self.key(query))
+        metrics.incr("detector.cache_hits" if pages is not None else "detector.cache_misses", 1)
+        return pages
+
+    def set(self, query: str, pages: List[Any]) -> bool:
+        """Cache a complete result; oversized results are skipped to keep memory bounded."""
+        if sum(len(p) for p in pages) > self.max_rows:
+            metrics.incr("detector.cache_skipped", 1)
+            return False
+        self._cache.set(self.key(query), pages)
+        return True
+
+    def clear(self) -> None:
+        self._cache.clear()
@@ -0,0 +1,116 @@
+"""
+similarity.py — vectorized cosine similarity over float32 embedding matrices.
+
+Contains:
+ - cosine(): single-pair cosine similarity (NumPy)
+ - EmbeddingMatrix: contiguous, row-normalized float32 matrix with batched
+   scoring and top-k search (one matrix product per call)
+
+Vectors of different lengths (e.g. fallback embeddings) are zero-padded or
+truncated to the matrix dimension, matching the zip-style truncation the
+intel agent used before.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VectorLike = Union[Sequence[float], np.ndarray]
+
+
+def as_matrix(vectors: Sequence[VectorLike], dim: Optional[int] = None) -> np.ndarray:
+    """Stack vectors into a C-contiguous float32 matrix, padding/truncating to `dim`."""
+    if isinstance(vectors, np.ndarray) and vectors.ndim == 2:
+        mat = np.ascontiguousarray(vectors, dtype=np.float32)
+        if dim is None or mat.shape[1] == dim:
+            return mat
+        out = np.zeros((mat.shape[0], dim), dtype=np.float32)
+        width = min(dim, mat.shape[1])
+        out[:, :width] = mat[:, :width]
+        return out
+    if dim is None:
+        dim = max((len(v) for v in vectors), default=0)
+    out = np.zeros((len(vectors), dim), dtype=np.float32)
+    for i, v in enumerate(vectors):
+        width = min(dim, len(v))
+        if width:
+            out[i, :width] = np.asarray(v[:width], dtype=np.float32)
+    return out
+
+
+def normalize_rows(mat: np.ndarray) -> np.ndarray:
+    """Scale rows to unit L2 norm in place; all-zero rows stay zero."""
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    np.divide(mat, norms, out=mat, where=norms > 0)
+    return mat
+
+
+def cosine(a: VectorLike, b: VectorLike) -> float:
+    if a is None or b is None or not len(a) or not len(b):
+        return 0.0
+    width = min(len(a), len(b))
+    x = np.asarray(a[:width], dtype=np.float64)
+    y = np.asarray(b[:width], dtype=np.float64)
+    denom = float(np.linalg.norm(x) * np.linalg.norm(y))
+    # clamp float rounding so identical vectors score exactly 1.0
+    return max(-1.0, min(1.0, float(np.dot(x, y)) / denom)) if denom else 0.0
+
+
+class EmbeddingMatrix:
+    """
+    Pre-normalized embedding rows with optional labels.
+
+    scores() returns cosine similarity for every (query, row) pair from a
+    single matrix product; top_k() picks the best rows per query with
+    argpartition, so cost stays linear in the number of rows.
+    """
+
+    def __init__(self, vectors: Sequence[VectorLike], labels: Optional[Sequence[Any]] = None,
+                 dim: Optional[int] = None) -> None:
+        self._rows = normalize_rows(as_matrix(vectors, dim))
+        self.labels: List[Any] = list(labels) if labels is not None else list(range(len(self._rows)))
+        if len(self.labels) != len(self._rows):
+            raise ValueError("labels and vectors differ in length")
+
+    def __len__(self) -> int:
+        return self._rows.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self._rows.shape[1]
+
+    @property
+    def rows(self) -> np.ndarray:
+        return self._rows
+
+    def _queries(self, queries: Union[VectorLike, Sequence[VectorLike]]) -> np.ndarray:
+        if isinstance(queries, np.ndarray) and queries.ndim == 1:
+            queries = [queries]
+        elif len(queries) and isinstance(queries[0], (int, float, np.floating)):
+            queries = [queries]  # a single vector
+        return normalize_rows(as_matrix(queries, self.dim))
+
+    def scores(self, queries: Union[VectorLike, Sequence[VectorLike]]) -> np.ndarray:
+        """Cosine similarity matrix of shape (len(queries), len(self))."""
+        return self._queries(queries) @ self._rows.T
+
+    def top_k(self, queries: Union[VectorLike, Sequence[VectorLike]], k: int = 5,
+              min_score: Optional[float] = None) -> List[List[Tuple[Any, float]]]:
+        """Best `k` (label, score) pairs per query, highest first."""
+        if not len(self):
+            return [[] for _ in range(len(self._queries(queries)))]
+        sims = self.scores(queries)
+        k = min(k, sims.shape[1])
+        part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        results: List[List[Tuple[Any, float]]] = []
+        for row, cols in zip(sims, part):
+            order = cols[np.argsort(-row[cols])]
+            hits = [(self.labels[j], float(row[j])) for j in order]
+            if min_score is not None:
+                hits = [h for h in hits if h[1] >= min_score]
+            results.append(hits)
+        return results
@@ -0,0 +1,107 @@
+"""
+summary_cache.py — compact incident projections and a content-addressed cache
+for the LLM text generated from them (correlator summaries, responder stories).
+
+Contains:
+ - project_incident(): bounded, canonical view of an incident or cluster:
+   severity, counts, duration, entities, tags and the top alerts' salient
+   fields (no ids, absolute timestamps or full evidence)
+ - summary_key(): "<kind>:<digest of the projection>"
+ - summary_cache(): process-wide LRU (summaries.cache_size / cache_ttl_seconds)
+
+The projection is both the prompt payload and the cache key. Prompts
+therefore stay the same size however many alerts an incident holds. Two
+incidents that look the same to the LLM share one generated text, even
+across hunts and incident ids.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Mapping, Optional
+
+from team_agents.agents.lib.config import get_config
+from team_agents.agents.lib.incident_store import incident_digest
+from team_agents.agents.lib.utils import LRUCache
+
+# evidence fields worth showing the LLM for an alert
+_ALERT_FIELDS = ("event", "source", "host", "user", "indicator_match", "derived_severity", "llm_note")
+
+_cache: Optional[LRUCache] = None
+
+
+def _limits() -> Dict[str, int]:
+    return {
+        "alerts": int(get_config("summaries.max_alerts", 5)),
+        "entities": int(get_config("summaries.max_entities", 20)),
+        "incidents": int(get_config("summaries.max_incidents", 5)),
+    }
+
+
+def _project_alert(alert: Mapping[str, Any]) -> Dict[str, Any]:
+    evidence = alert.get("evidence") or {}
+    view = {k: evidence[k] for k in _ALERT_FIELDS if evidence.get(k) is not None}
+    if isinstance(view.get("llm_note"), str):
+        view["llm_note"] = view["llm_note"][:160]
+    view["score"] = round(float(alert.get("score") or 0), 1)
+    if alert.get("tags"):
+        view["tags"] = sorted(alert["tags"])
+    return view
+
+
+def _project_one(incident: Mapping[str, Any], limits: Dict[str, int]) -> Dict[str, Any]:
+    alerts = list(incident.get("alerts") or [])
+    entities = sorted(incident.get("entities") or [f"host:{h}" for h in incident.get("hosts") or []])
+    top = sorted(alerts, key=lambda a: float(a.get("score") or 0), reverse=True)
+    shown: List[Dict[str, Any]] = []
+    for a in top:
+        view = _project_alert(a)
+        if view not in shown:  # repeated identical alerts add nothing for the LLM
+            shown.append(view)
+        if len(shown) >= limits["alerts"]:
+            break
+    first, last = incident.get("first_seen"), incident.get("last_seen")
+    out: Dict[str, Any] = {
+        "severity": round(float(incident.get("severity") or 0), 1),
+        "alert_count": int(incident.get("alert_count") or len(alerts)),
+        "entities": entities[:limits["entities"]],
+        "tags": sorted({t for a in alerts for t in (a.get("tags") or [])}),
+        "top_alerts": shown,
+    }
+    if len(entities) > limits["entities"]:
+        out["more_entities"] = len(entities) - limits["entities"]
+    if first is not None and last is not None:
+        out["duration_seconds"] = int(float(last) - float(first))
+    return out
+
+
+def project_incident(incident: Mapping[str, Any]) -> Dict[str, Any]:
+    """Compact projection of an incident, or of a cluster and its largest incidents."""
+    limits = _limits()
+    parts = incident.get("incidents")
+    if not parts:
+        return _project_one(incident, limits)
+    ranked = sorted(parts, key=lambda i: (float(i.get("severity") or 0), int(i.get("alert_count") or 0)), reverse=True)
+    out: Dict[str, Any] = {
+        "severity": round(float(incident.get("severity") or 0), 1),
+        "incident_count": len(parts),
+        "incidents": [_project_one(i, limits) for i in ranked[:limits["incidents"]]],
+    }
+    if len(parts) > limits["incidents"]:
+        out["more_incidents"] = len(parts) - limits["incidents"]
+    return out
+
+
+def projection_text(projection: Mapping[str, Any]) -> str:
+    return json.dumps(projection, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def summary_key(kind: str, projection: Mapping[str, Any]) -> str:
+    return f"{kind}:{incident_digest(projection, fields=None)}"
+
+
+def summary_cache() -> LRUCache:
+    global _cache
+    if _cache is None:
+        _cache = LRUCache(max_entries=int(get_config("summaries.cache_size") or 1024),
+                          ttl=float(get_config("summaries.cache_ttl_seconds") or 86400))
+    return _cache
@@ -6,6 +6,7 @@ Contains:
  - typed helpers for defensive programming
  - JSON-safe serialization helpers
  - in-memory cache wrapper (thread-safe)
+ - bounded LRU cache with optional TTL (thread-safe)
 """
 from __future__ import annotations
 
@@ -13,8 +14,8 @@ import json
 import logging
 import threading
 import time
-from collections import defaultdict
-from typing import Any, Dict, Optional
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Hashable, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +25,7 @@ class Metrics:
         self._lock = threading.Lock()
         self._counters: Dict[str, int] = defaultdict(int)
         self._timings: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
 
     def incr(self, name: str, amount: int = 1) -> None:
         with self._lock:
@@ -33,11 +35,17 @@ class Metrics:
         with self._lock:
             self._timings[name] += seconds
 
+    def gauge(self, name: str, value: float) -> None:
+        # last value wins (e.g. memory in use, ratios)
+        with self._lock:
+            self._gauges[name] = value
+
     def snapshot(self) -> Dict[str, Any]:
         with self._lock:
             return {
                 "counters": dict(self._counters),
                 "timings": dict(self._timings),
+                "gauges": dict(self._gauges),
             }
 
 metrics = Metrics()
@@ -71,6 +79,45 @@ class SimpleCache:
 
 cache = SimpleCache()
 
+# Bounded LRU cache with optional TTL; evicts least recently used entries
+class LRUCache:
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None) -> None:
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return default
+            value, exp = hit
+            if time.time() > exp:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = ttl if ttl is not None else self.ttl
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else float("inf"))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
 # Defensive helper that attempts to extract keys and provide defaults
 def safe_get(dct: dict, key: str, default: Any = None) -> Any:
     try:
@@ -0,0 +1,170 @@
+"""
+watermarks.py — per-hypothesis scan watermarks for incremental hunts.
+
+Contains:
+ - WatermarkStore: last scanned event timestamp per hypothesis, persisted
+   as a small JSON file ({"<hypothesis id>": <epoch seconds>})
+ - next_watermark(): where a scan may safely move the watermark to
+ - watermark_store(): process-wide store configured from query_builder.*
+
+The query builder bounds each hypothesis query with `ts > watermark` and
+sorts ascending, so a result that was cut short (limit, timeout) is still a
+prefix in time order. The detector then advances the watermark to the
+newest timestamp it saw; when the scan was incomplete it stops one distinct
+timestamp short, because rows sharing the newest timestamp may not all have
+been delivered. Those rows are scanned again on the next hunt
+(at-least-once at the boundary, never a gap).
+
+A hypothesis without a watermark starts `initial_lookback` seconds back
+(0 means from the beginning of the index), rounded down to `bucket_seconds`
+so the query text, and with it the detector's result-cache key, stays the
+same within a bucket.
+
+Several hunts or workers may share one file: flush() takes a lock (a thread
+lock plus an flock on "<path>.lock" where available), re-reads the file and
+writes the per-key maximum, so a concurrent writer's progress is never lost.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+try:  # optional, cross-process locking (POSIX)
+    import fcntl  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    fcntl = None
+
+from team_agents.agents.lib.config import get_config
+
+logger = logging.getLogger(__name__)
+
+
+def next_watermark(ts_values: Iterable[float], complete: bool) -> Optional[float]:
+    """New watermark from the timestamps a scan returned, or None to leave it as is."""
+    newest = second = None
+    for ts in ts_values:
+        if newest is None or ts > newest:
+            newest, second = ts, newest
+        elif ts < newest and (second is None or ts > second):
+            second = ts
+    return newest if complete else second
+
+
+class WatermarkStore:
+    def __init__(
+        self,
+        path: str,
+        initial_lookback: float = 3600,
+        bucket_seconds: float = 60,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = path
+        self.initial_lookback = float(initial_lookback)
+        self.bucket_seconds = float(bucket_seconds)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._marks: Dict[str, float] = self._load()
+        self._dirty = False
+
+    def _load(self) -> Dict[str, float]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                return {str(k): float(v) for k, v in json.load(fh).items()}
+        except FileNotFoundError:
+            return {}
+        except Exception as exc:
+            logger.warning("Ignoring unreadable watermark file %s: %s", self.path, exc)
+            return {}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._marks
+
+    def get(self, key: str) -> float:
+        """Lower time bound (exclusive) for the next scan of `key`."""
+        if key in self._marks:
+            return self._marks[key]
+        if self.initial_lookback <= 0:
+            return 0.0
+        since = self._clock() - self.initial_lookback
+        if self.bucket_seconds > 0:
+            since = (since // self.bucket_seconds) * self.bucket_seconds
+        return since
+
+    def advance(self, key: str, ts: float) -> bool:
+        """Move the watermark forward; it never moves back."""
+        if ts <= self._marks.get(key, float("-inf")):
+            return False
+        self._marks[key] = float(ts)
+        self._dirty = True
+        return True
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(f"{self.path}.lock", "a") as lock:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _write(self, marks: Dict[str, float]) -> None:
+        tmp = f"{self.path}.tmp.{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(marks, fh)
+        os.replace(tmp, self.path)
+
+    def reset(self, key: Optional[str] = None) -> None:
+        """Drop one watermark (or all of them), here and in the file."""
+        with self._locked():
+            on_disk = self._load()
+            if key is None:
+                self._marks.clear()
+                on_disk.clear()
+            else:
+                self._marks.pop(key, None)
+                on_disk.pop(key, None)
+            self._write(on_disk)
+            self._dirty = False
+
+    def flush(self) -> None:
+        """Merge the watermarks into the file (per-key maximum) if anything changed."""
+        if not self._dirty:
+            return
+        with self._locked():
+            merged = self._load()
+            for key, ts in self._marks.items():
+                if ts > merged.get(key, float("-inf")):
+                    merged[key] = ts
+            self._write(merged)
+            # pick up other writers' progress too
+            self._marks.update(merged)
+            self._dirty = False
+
+    def snapshot(self) -> Dict[str, float]:
+        return dict(self._marks)
+
+
+_store: Optional[WatermarkStore] = None
+
+
+def watermark_store() -> WatermarkStore:
+    global _store
+    if _store is None:
+        _store = WatermarkStore(
+            get_config("query_builder.watermark_path") or "data/hunt_watermarks.json",
+            initial_lookback=float(get_config("query_builder.initial_lookback_seconds", 3600)),
+            bucket_seconds=float(get_config("detector.cache_bucket_seconds") or 60),
+        )
+    return _store
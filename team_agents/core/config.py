@@ -6,6 +6,10 @@ class Settings(BaseSettings):
     openai_llm_default_model: str = os.getenv("OPENAI_LLM_DEFAULT_MODEL", "gpt-4o-mini")
     openai_llm_default_temperature: float = os.getenv("OPENAI_LLM_DEFAULT_TEMPERATURE", 0.0)
     openai_llm_default_embedding_model: str = os.getenv("OPENAI_LLM_DEFAULT_EMBEDDING_MODEL", "text-embedding-3-small")
+    embedding_cache_size: int = int(os.getenv("EMBEDDING_CACHE_SIZE", 10000))
+    embedding_cache_path: str = os.getenv("EMBEDDING_CACHE_PATH", "")
+    embedding_engine: str = os.getenv("EMBEDDING_ENGINE", "openai")  # "openai" or "local"
+    local_embedding_dim: int = int(os.getenv("LOCAL_EMBEDDING_DIM", 256))
     env: str = os.getenv("ENV", "dev")
 
 settings = Settings()
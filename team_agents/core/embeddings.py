@@ -0,0 +1,241 @@
+"""
+core/embeddings.py — cached, batched embedding store.
+
+Provides:
+ - EmbeddingStore: embeddings keyed by (model, sha256(text)) with an in-memory
+   LRU, an optional SQLite layer and an embed_many() batch API that sends only
+   cache misses upstream, in a single request.
+ - HashedNgramEmbedder: local, fixed-dimension embeddings from hashed character
+   n-grams, computed for a whole batch with a handful of NumPy operations.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from array import array
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from team_agents.agents.lib.utils import LRUCache, metrics
+
+logger = logging.getLogger(__name__)
+
+Vector = List[float]
+BatchEmbedder = Callable[[List[str]], List[Vector]]
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class HashedNgramEmbedder:
+    """
+    Feature-hashed character n-gram embeddings (no network, no model files).
+
+    Every n-gram of the lower-cased UTF-8 bytes is hashed into one of `dim`
+    buckets with a hashed +/-1 sign, and rows are L2-normalized, so texts that
+    share substrings (domains, paths, hashes) land close in cosine space.
+    The batch is concatenated into one byte array and hashed with sliding
+    windows, so the cost is a few vector ops per n-gram size, not per text.
+    """
+
+    _MULT = np.uint64(0x100000001B3)  # FNV-64 prime
+    _MIX = np.uint64(0x9E3779B97F4A7C15)
+
+    def __init__(self, dim: int = 256, ngram_range: Tuple[int, int] = (2, 4)) -> None:
+        if dim <= 0:
+            raise ValueError("dim must be positive")
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    @property
+    def name(self) -> str:
+        lo, hi = self.ngram_range
+        return f"local-ngram-{lo}-{hi}-d{self.dim}"
+
+    def __call__(self, texts: List[str]) -> List[Vector]:
+        return self.embed_matrix(texts).tolist()
+
+    def embed_matrix(self, texts: Sequence[str]) -> np.ndarray:
+        n = len(texts)
+        if not n:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        # pad each text with spaces so prefixes / suffixes form their own n-grams,
+        # then join with a separator whose doc id (-1) invalidates crossing windows
+        encoded = [b" " + t.lower().encode("utf-8", "replace") + b" " if t else b"" for t in texts]
+        codes = np.frombuffer(b"\x00".join(encoded), dtype=np.uint8).astype(np.uint64)
+        lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=n)
+        doc = np.repeat(np.arange(n, dtype=np.int64), lengths + 1)[:-1]
+        doc[np.cumsum(lengths + 1)[:-1] - 1] = -1
+        lo, hi = self.ngram_range
+        all_slots: List[np.ndarray] = []
+        all_signs: List[np.ndarray] = []
+        with np.errstate(over="ignore"):
+            for size in range(lo, hi + 1):
+                if len(codes) < size:
+                    break
+                windows = np.lib.stride_tricks.sliding_window_view(codes, size)
+                h = np.full(len(windows), size, dtype=np.uint64)
+                for j in range(size):
+                    h = (h * self._MULT) ^ windows[:, j]
+                h *= self._MIX
+                h ^= h >> np.uint64(29)
+                start, end = doc[: len(windows)], doc[size - 1:]
+                valid = (start >= 0) & (start == end)
+                h = h[valid]
+                all_slots.append(start[valid] * self.dim + (h % np.uint64(self.dim)).astype(np.int64))
+                all_signs.append(np.where((h >> np.uint64(63)) == 0, 1.0, -1.0))
+        if all_slots:
+            counts = np.bincount(np.concatenate(all_slots), weights=np.concatenate(all_signs), minlength=n * self.dim)
+        else:
+            counts = np.zeros(n * self.dim)
+        mat = counts.astype(np.float32).reshape(n, self.dim)
+        norms = np.linalg.norm(mat, axis=1, keepdims=True)
+        np.divide(mat, norms, out=mat, where=norms > 0)
+        return mat
+
+
+class _SQLiteLayer:
+    """Float32 vectors persisted in SQLite, shared by every process on the host."""
+
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL, digest TEXT NOT NULL, vec BLOB NOT NULL,"
+                " PRIMARY KEY (model, digest))"
+            )
+
+    def get_many(self, model: str, digests: Sequence[str]) -> Dict[str, Vector]:
+        found: Dict[str, Vector] = {}
+        with self._lock:
+            # stay well under SQLite's bound-parameter limit
+            for i in range(0, len(digests), 500):
+                chunk = list(digests[i:i + 500])
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT digest, vec FROM embeddings WHERE model = ? AND digest IN ({marks})",
+                    [model, *chunk],
+                ).fetchall()
+                for digest, blob in rows:
+                    found[digest] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, model: str, rows: Sequence[Tuple[str, Vector]]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, digest, vec) VALUES (?, ?, ?)",
+                [(model, digest, array("f", vec).tobytes()) for digest, vec in rows],
+            )
+
+
+class EmbeddingStore:
+    """
+    Embedding cache in front of a batch embedding backend.
+
+    Lookups go memory -> SQLite (if configured) -> backend. Vectors produced
+    by `fallback` (used when the backend fails) are returned but never cached,
+    so the real model is retried on the next call; embed_many_tagged() tells
+    callers that keep vectors around which model produced them.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        backend: BatchEmbedder,
+        fallback: Optional[BatchEmbedder] = None,
+        max_entries: int = 10_000,
+        path: Optional[str] = None,
+    ) -> None:
+        self.model = model
+        self._backend = backend
+        self._fallback = fallback
+        self.fallback_model = getattr(fallback, "name", "fallback") if fallback else "none"
+        self._memory = LRUCache(max_entries=max_entries)
+        self._disk: Optional[_SQLiteLayer] = None
+        if path:
+            try:
+                self._disk = _SQLiteLayer(path)
+            except sqlite3.Error as exc:
+                logger.warning("Embedding cache disabled on disk (%s): %s", path, exc)
+
+    def embed(self, text: str) -> Vector:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: Sequence[str]) -> List[Vector]:
+        return self.embed_many_tagged(texts)[0]
+
+    def embed_many_tagged(self, texts: Sequence[str]) -> Tuple[List[Vector], str]:
+        """
+        Vectors plus the model that produced them: self.model, or fallback_model
+        when any of them had to come from the fallback (vectors of the two are
+        not comparable).
+        """
+        model = self.model
+        results: List[Optional[Vector]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            digest = _digest(text)
+            vec = self._memory.get((self.model, digest))
+            if vec is not None:
+                results[i] = vec
+            else:
+                missing.setdefault(digest, []).append(i)
+        metrics.incr("embeddings.memory_hits", len(texts) - sum(len(v) for v in missing.values()))
+
+        if missing and self._disk is not None:
+            try:
+                found = self._disk.get_many(self.model, list(missing))
+            except sqlite3.Error as exc:
+                logger.warning("Embedding cache read failed: %s", exc)
+                found = {}
+            for digest, vec in found.items():
+                self._memory.set((self.model, digest), vec)
+                for i in missing.pop(digest):
+                    results[i] = vec
+            metrics.incr("embeddings.disk_hits", len(found))
+
+        if missing:
+            digests = list(missing)
+            batch = [texts[missing[d][0]] for d in digests]
+            vectors = self._embed_upstream(batch)
+            if vectors is not None:
+                for digest, vec in zip(digests, vectors):
+                    self._memory.set((self.model, digest), vec)
+                if self._disk is not None:
+                    try:
+                        self._disk.put_many(self.model, list(zip(digests, vectors)))
+                    except sqlite3.Error as exc:
+                        logger.warning("Embedding cache write failed: %s", exc)
+            else:
+                vectors = self._fallback(batch) if self._fallback else [[] for _ in batch]
+                model = self.fallback_model
+            for digest, vec in zip(digests, vectors):
+                for i in missing[digest]:
+                    results[i] = vec
+        return results, model  # type: ignore[return-value]
+
+    def _embed_upstream(self, batch: List[str]) -> Optional[List[Vector]]:
+        try:
+            vectors = self._backend(batch)
+        except Exception as exc:
+            logger.warning("Embedding call failed for %d texts: %s", len(batch), exc)
+            metrics.incr("embeddings.errors", 1)
+            return None
+        if len(vectors) != len(batch):
+            logger.warning("Embedding backend returned %d vectors for %d texts", len(vectors), len(batch))
+            metrics.incr("embeddings.errors", 1)
+            return None
+        metrics.incr("embeddings.upstream_requests", 1)
+        metrics.incr("embeddings.upstream_texts", len(batch))
+        return vectors
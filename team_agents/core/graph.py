@@ -62,14 +62,25 @@ def _pretty_print_results(state: HuntState) -> None:
         logger.info("Story: %s", state.story.get("summary"))
 
 
+async def _main() -> Dict[str, Any]:
+    from team_agents.tools.elastic_esql import close_async_client
+
+    try:
+        return await hunt_graph.ainvoke(HuntState())
+    finally:
+        await close_async_client()
+
+
 if __name__ == "__main__":
+    import asyncio
+
     try:
-        result = hunt_graph.invoke(HuntState())
+        result = asyncio.run(_main())
     except Exception as exc:
         logger.exception("Graph execution failed: %s", exc)
         raise
     else:
-        _pretty_print_results(result)
+        _pretty_print_results(HuntState(**result))
 
 
 def build_graph():
@@ -3,7 +3,8 @@ core/llm.py — Async LLM wrapper and LangChain integrations.
 
 Provides:
  - AsyncChatLLM: thin async wrapper around LangChain ChatOpenAI with fallback.
- - embedder() placeholder for vectorization (expandable).
+ - embedder() / embed_many() backed by a cached, batched EmbeddingStore, using
+   OpenAI embeddings or the local hashed n-gram engine (settings.embedding_engine).
  - safe_ask_llm(prompt, max_tokens=512) coroutine returns dict with 'text' and raw `llm_response`.
 """
 from __future__ import annotations
@@ -12,6 +13,7 @@ import asyncio
 import logging
 from typing import Any, Dict, Optional
 from team_agents.core.config import settings
+from team_agents.core.embeddings import EmbeddingStore, HashedNgramEmbedder
 
 OPENAI_API_KEY = settings.openai_api_key
 OPENAI_LLM_DEFAULT_MODEL = settings.openai_llm_default_model
@@ -82,21 +84,56 @@ class AsyncChatLLM:
 # Instantiate a global LLM instance for use by team_agents (async-friendly)
 llm = AsyncChatLLM()
 
-# Placeholder: simple synchronous embedder stub (replace with real embeddings provider)
+_embedding_client = None
+
+def _openai_embed_batch(texts: list[str]) -> list[list[float]]:
+    """
+    Embed a batch of texts using OpenAI embeddings via LangChain (one request).
+    The client is built once and receives the key directly instead of via os.environ.
+    """
+    global _embedding_client
+    if _embedding_client is None:
+        _embedding_client = OpenAIEmbeddings(model=OPENAI_LLM_DEFAULT_EMBEDDING_MODEL, openai_api_key=OPENAI_API_KEY)
+    return _embedding_client.embed_documents(texts)
+
+local_embedder = HashedNgramEmbedder(dim=settings.local_embedding_dim)
+
+def _build_embedding_store() -> EmbeddingStore:
+    engine = settings.embedding_engine.lower()
+    if engine == "openai" and not OPENAI_API_KEY:
+        # no point failing one request per miss; same behaviour as the LLM simulator
+        logger.info("OPENAI_API_KEY not set; using local embedding engine")
+        engine = "local"
+    if engine == "local":
+        # local vectors are cheaper to recompute than to read back from SQLite
+        return EmbeddingStore(model=local_embedder.name, backend=local_embedder,
+                              max_entries=settings.embedding_cache_size)
+    if engine != "openai":
+        logger.warning("Unknown embedding engine %r; using openai", settings.embedding_engine)
+    return EmbeddingStore(
+        model=OPENAI_LLM_DEFAULT_EMBEDDING_MODEL,
+        backend=_openai_embed_batch,
+        fallback=local_embedder,
+        max_entries=settings.embedding_cache_size,
+        path=settings.embedding_cache_path or None,
+    )
+
+embedding_store = _build_embedding_store()
+
 def embedder(text: str) -> list[float]:
-    try:
-        """
-        Embed text using OpenAI embeddings via LangChain.
-        You’ll need to have your OPENAI_API_KEY set as an environment variable
-        """
-        import os
-        os.environ['OPENAI_API_KEY'] = OPENAI_API_KEY
-        embedding_model = OpenAIEmbeddings(model=OPENAI_LLM_DEFAULT_EMBEDDING_MODEL)
-        return embedding_model.embed_query(text)
-    except Exception as e:
-        # deterministic trivial embedding for demo purposes
-        logger.exception("Embedding call failed: %s", e)
-        return [float(ord(c) % 97) / 97.0 for c in text[:128]]
+    return embedding_store.embed(text)
+
+def embed_many(texts: list[str]) -> list[list[float]]:
+    """Embed several texts; cached vectors are reused and only misses go upstream, in one request."""
+    return embedding_store.embed_many(texts)
+
+def embedding_model() -> str:
+    """Name of the primary embedding model (vectors tagged otherwise came from the fallback)."""
+    return embedding_store.model
+
+def embed_many_tagged(texts: list[str]) -> tuple[list[list[float]], str]:
+    """embed_many() plus the model the vectors came from (differs from the primary during an outage)."""
+    return embedding_store.embed_many_tagged(texts)
 
 async def safe_ask_llm(prompt: str, max_tokens: int = 512) -> Dict[str, Any]:
     return await llm.ask(prompt, max_tokens=max_tokens)
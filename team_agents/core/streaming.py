@@ -0,0 +1,227 @@
+"""
+streaming.py — micro-batch streaming run mode for the hunt pipeline.
+
+Provides:
+ - run_streaming(events): consume an async iterator of events, cut it into
+   micro-batches (by size or by time) and push each batch through the
+   detection stages (collector -> intel -> hypothesis -> query builder ->
+   detector); correlation and response then run once over every alert.
+ - run_backfill(source): run_streaming() over a JSONL file at disk speed
+   (JsonlFileSource.aiter_chunks, optionally parsed in a process pool),
+   checkpointing the file offset as batches finish; see backfill.py
+
+Only the in-flight batches and the accumulated alerts are held in memory, so
+peak usage is bounded by batch_size * max_inflight rather than by the total
+input size. Backpressure reaches the producer through a bounded queue;
+producers that meter their own input (e.g. the WebSocket ingest credits) or
+checkpoint it (backfills) pass on_batch_done to learn when a batch's events
+have left the pipeline.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from langgraph.graph import END
+
+from team_agents.agents.a_collector import collector_agent
+from team_agents.agents.b_intel import intel_agent
+from team_agents.agents.c_hypothesis import hypothesis_agent
+from team_agents.agents.d_query_builder import query_builder_agent
+from team_agents.agents.e_detector import detector_agent
+from team_agents.agents.f_correlator import correlator_agent
+from team_agents.agents.g_responder import responder_agent
+from team_agents.agents.lib.config import get_config
+from team_agents.agents.lib.file_source import JsonlFileSource
+from team_agents.agents.lib.utils import metrics
+from team_agents.core.graph import HuntState
+
+logger = logging.getLogger(__name__)
+
+# per-batch stages, keyed by graph node name so agents' Command(goto=...) routing is honoured
+BATCH_STAGES: Dict[str, Callable[[Any], Awaitable[Any]]] = {
+    "collector_node": collector_agent,
+    "intel_agent": intel_agent,
+    "hypothesis_agent": hypothesis_agent,
+    "query_builder_agent": query_builder_agent,
+    "detector_node": detector_agent,
+}
+FINAL_STAGES: Dict[str, Callable[[Any], Awaitable[Any]]] = {
+    "correlator_node": correlator_agent,
+    "responder_node": responder_agent,
+}
+
+_EOF = object()
+
+
+async def _run_stages(state: Any, stages: Dict[str, Callable[[Any], Awaitable[Any]]], entry: str) -> Optional[str]:
+    """Run agents from `entry` while their goto stays inside `stages`; returns the node it left for."""
+    node: Optional[str] = entry
+    while node in stages:
+        cmd = await stages[node](state)
+        goto = getattr(cmd, "goto", END)
+        node = goto if isinstance(goto, str) else None
+    return None if node == END else node
+
+
+async def _pump(events: AsyncIterable[Any], queue: "asyncio.Queue[Any]") -> None:
+    try:
+        async for evt in events:
+            await queue.put(evt)
+    finally:
+        await queue.put(_EOF)
+
+
+async def _micro_batches(queue: "asyncio.Queue[Any]", batch_size: int, max_wait: float):
+    """Yield lists of up to batch_size events; a partial batch is flushed after max_wait seconds."""
+    loop = asyncio.get_running_loop()
+    getter: Optional[asyncio.Task] = None
+    batch: List[Any] = []
+    deadline = 0.0
+    while True:
+        if getter is None:
+            getter = asyncio.ensure_future(queue.get())
+        # wait on the pending get rather than cancelling it, so no event is dropped at a timeout
+        timeout = max(0.0, deadline - loop.time()) if batch else None
+        done, _ = await asyncio.wait({getter}, timeout=timeout)
+        if not done:
+            yield batch
+            batch = []
+            continue
+        evt = getter.result()
+        getter = None
+        if evt is _EOF:
+            if batch:
+                yield batch
+            return
+        if not batch:
+            deadline = loop.time() + max_wait
+        batch.append(evt)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+
+async def run_streaming(
+    events: AsyncIterable[Any],
+    batch_size: Optional[int] = None,
+    max_wait_seconds: Optional[float] = None,
+    max_inflight: Optional[int] = None,
+    state_factory: Callable[..., Any] = HuntState,
+    on_batch_done: Optional[Callable[[int, int, bool], Awaitable[Any]]] = None,
+) -> Any:
+    """
+    Run the hunt over an async stream of events; returns the final HuntState.
+
+    Each micro-batch gets its own state, which is dropped once its alerts are
+    collected. The returned state carries the accumulated alerts, the story
+    and the correlator/responder evidence. on_batch_done(seq, n, ok) is
+    awaited after batch number `seq` (0-based, in stream order) of n events
+    has been processed (ok=True) or has failed; batches may finish out of order.
+    """
+    batch_size = int(batch_size or get_config("streaming.batch_size") or 500)
+    max_wait = float(max_wait_seconds or get_config("streaming.max_wait_seconds") or 1.0)
+    max_inflight = int(max_inflight or get_config("streaming.max_inflight") or 2)
+
+    start = time.time()
+    queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=batch_size * max_inflight)
+    pump = asyncio.create_task(_pump(events, queue))
+    slots = asyncio.Semaphore(max_inflight)
+    alerts: List[Any] = []
+    pending: set = set()
+    batches = 0
+
+    async def _process(seq: int, batch: List[Any]) -> None:
+        ok = False
+        try:
+            state = state_factory(messages=batch)
+            handoff = await _run_stages(state, BATCH_STAGES, "collector_node")
+            if handoff is not None and state.alerts:
+                alerts.extend(state.alerts)
+                metrics.incr("streaming.alerts", len(state.alerts))
+            ok = True
+        except Exception as exc:
+            logger.exception("Streaming batch of %d events failed: %s", len(batch), exc)
+            metrics.incr("streaming.batch_errors", 1)
+        finally:
+            slots.release()
+            if on_batch_done is not None:
+                try:
+                    await on_batch_done(seq, len(batch), ok)
+                except Exception as exc:
+                    logger.warning("on_batch_done callback failed: %s", exc)
+
+    try:
+        async for batch in _micro_batches(queue, batch_size, max_wait):
+            await slots.acquire()  # bounded in-flight batches; stops draining the queue when full
+            metrics.incr("streaming.batches", 1)
+            metrics.incr("streaming.events", len(batch))
+            task = asyncio.create_task(_process(batches, batch))
+            batches += 1
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+        await pump  # surface producer errors
+    finally:
+        if not pump.done():
+            pump.cancel()
+
+    final = state_factory(alerts=alerts)
+    if alerts:
+        await _run_stages(final, FINAL_STAGES, "correlator_node")
+    elapsed = time.time() - start
+    metrics.timing("streaming.duration_seconds", elapsed)
+    logger.info("Streaming run processed %d batches, %d alerts (duration=%.3fs)", batches, len(alerts), elapsed)
+    return final
+
+
+async def run_backfill(source: JsonlFileSource, final: bool = False, **kwargs: Any) -> Any:
+    """
+    run_streaming() over a JSONL file from its checkpoint to EOF; returns the final state.
+
+    The checkpoint only moves past a chunk once every batch holding its events
+    has been processed, in stream order; after a failed batch it stays put, so
+    a rerun starts again at the first chunk that was not fully processed.
+    `final` also delivers an unterminated last line (the file is complete).
+    """
+    loop = asyncio.get_running_loop()
+    ends: List[Tuple[int, int]] = []  # (events delivered through the chunk, chunk end offset)
+    finished: Dict[int, Tuple[int, bool]] = {}
+    progress = {"next": 0, "processed": 0, "failed": False}
+    commit_lock = asyncio.Lock()
+
+    async def _events() -> AsyncIterator[Any]:
+        delivered = 0
+        async for events, end in source.aiter_chunks(final=final):
+            delivered += len(events)
+            ends.append((delivered, end))
+            for evt in events:
+                yield evt
+
+    async def _batch_done(seq: int, count: int, ok: bool) -> None:
+        finished[seq] = (count, ok)
+        end = None
+        while not progress["failed"] and progress["next"] in finished:
+            count, ok = finished.pop(progress["next"])
+            if not ok:
+                progress["failed"] = True
+                logger.warning("Backfill of %s: batch %d failed; checkpoint stops before it",
+                               source.path, progress["next"])
+                break
+            progress["next"] += 1
+            progress["processed"] += count
+            while ends and ends[0][0] <= progress["processed"]:
+                end = ends.pop(0)[1]
+        if end is not None:
+            async with commit_lock:
+                if end > source.offset:
+                    await loop.run_in_executor(None, source.commit, end)
+                    metrics.gauge("streaming.backfill_offset", end)
+
+    started = source.offset
+    final_state = await run_streaming(_events(), on_batch_done=_batch_done, **kwargs)
+    logger.info("Backfill of %s: offset %d -> %d", source.path, started, source.offset)
+    return final_state
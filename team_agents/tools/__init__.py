@@ -3,7 +3,7 @@ tools package for team_agents
 Exports the main helpers used by team_agents and tests.
 """
 from fastAPI.schemas import Indicator, FeedResponse, parse_feed_response
-from .cti_feed import fetch_feed
+from .cti_feed import fetch_feed, fetch_feed_delta
 from .soar_actions import perform_action, SOARAction
 from .elastic_esql import run_query, ESQLQuery
 
@@ -12,6 +12,7 @@ __all__ = [
     "FeedResponse",
     "parse_feed_response",
     "fetch_feed",
+    "fetch_feed_delta",
     "perform_action",
     "SOARAction",
     "run_query",
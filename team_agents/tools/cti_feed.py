@@ -4,7 +4,7 @@ cti_feed.py – CTI feed ingestion helpers (sync).
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 import httpx
 from pydantic import BaseModel, Field, ValidationError
@@ -19,18 +19,37 @@ class CTIItem(BaseModel):
     type: str = Field(..., description="Item type")
     attributes: Dict[str, Any] = Field(default_factory=dict)
 
+class FeedDelta(BaseModel):
+    """
+    Result of a conditional / incremental feed request.
+
+    full=True means `added` is the complete feed; otherwise `added` and
+    `removed` (item ids) are changes since the cursor that was sent.
+    """
+    not_modified: bool = Field(False, description="Server answered 304")
+    full: bool = Field(True, description="Payload replaces the whole feed")
+    added: List[Dict[str, Any]] = Field(default_factory=list)
+    removed: List[str] = Field(default_factory=list)
+    etag: Optional[str] = Field(None)
+    last_modified: Optional[str] = Field(None)
+    cursor: Optional[str] = Field(None)
+
 _client = get_httpx_client()
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=8), reraise=True)
-def _fetch(url: str, headers: Dict[str, str]) -> httpx.Response:
-    return _client.get(url, headers=headers, timeout=10.0)
+def _fetch(url: str, headers: Dict[str, str], params: Optional[Dict[str, str]] = None) -> httpx.Response:
+    return _client.get(url, headers=headers, params=params, timeout=10.0)
 
-def fetch_feed(url: str | None = None) -> List[CTIItem]:
-    url = url or get_env("CTI_FEED_URL", "https://cti.example.com/feed")
+def _auth_headers() -> Dict[str, str]:
     headers: Dict[str, str] = {}
     token = get_env("CTI_FEED_TOKEN")
     if token:
         headers["Authorization"] = f"Bearer {token}"
+    return headers
+
+def fetch_feed(url: str | None = None) -> List[CTIItem]:
+    url = url or get_env("CTI_FEED_URL", "https://cti.example.com/feed")
+    headers = _auth_headers()
 
     logger.info("Fetching CTI feed from %s", url)
     try:
@@ -42,3 +61,47 @@ def fetch_feed(url: str | None = None) -> List[CTIItem]:
     except (httpx.HTTPError, ValidationError, ValueError) as exc:
         logger.error("Failed to fetch or parse CTI feed: %s", exc)
         return []
+
+def fetch_feed_delta(
+    url: str | None = None,
+    etag: str | None = None,
+    last_modified: str | None = None,
+    cursor: str | None = None,
+) -> FeedDelta:
+    """
+    Conditionally fetch the CTI feed.
+
+    Sends If-None-Match / If-Modified-Since and a `since` cursor when known.
+    A 304 returns immediately without parsing anything. Servers that support
+    incremental sync answer with `added` / `removed` lists; otherwise the
+    `data` list is returned as a full replacement. Unlike fetch_feed, errors
+    are raised so callers can keep their last good copy.
+    """
+    url = url or get_env("CTI_FEED_URL", "https://cti.example.com/feed")
+    headers = _auth_headers()
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    params = {"since": cursor} if cursor else None
+
+    logger.info("Syncing CTI feed from %s (cursor=%s)", url, cursor)
+    resp = _fetch(url, headers, params)
+    if resp.status_code == 304:
+        logger.info("CTI feed not modified")
+        return FeedDelta(not_modified=True, full=False, etag=etag, last_modified=last_modified, cursor=cursor)
+    resp.raise_for_status()
+    data = resp.json()
+    delta = "added" in data or "removed" in data
+    raw_items = data.get("added", []) if delta else data.get("data", [])
+    added = [CTIItem.parse_obj(item).dict() for item in raw_items]
+    removed = [str(r.get("id") if isinstance(r, dict) else r) for r in data.get("removed", [])]
+    logger.info("Parsed CTI %s: %d added, %d removed", "delta" if delta else "feed", len(added), len(removed))
+    return FeedDelta(
+        full=not delta,
+        added=added,
+        removed=removed,
+        etag=resp.headers.get("ETag"),
+        last_modified=resp.headers.get("Last-Modified"),
+        cursor=data.get("cursor") or data.get("next_cursor"),
+    )
@@ -1,10 +1,19 @@
 """
-elastic_esql.py – minimal ESQL runner wrapper (sync).
+elastic_esql.py – minimal ESQL runner wrapper.
+
+Provides:
+ - run_query(): sync runner on a shared Elasticsearch client (with retries)
+ - iter_query_pages(): async generator of ColumnBatch pages fetched with the
+   SQL cursor (fetch_size rows at a time) on a pooled AsyncElasticsearch client,
+   one per event loop, bounded by a per-query deadline instead of retries
+ - close_async_client(): close the running loop's pooled client (app / CLI shutdown)
 """
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional
+import weakref
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
 
 from pydantic import BaseModel, Field, ValidationError
 from tenacity import retry, stop_after_attempt, wait_exponential
@@ -18,6 +27,18 @@ try:
 except Exception:
     Elasticsearch = None  # type: ignore
 
+try:
+    from elasticsearch import AsyncElasticsearch  # type: ignore
+except Exception:
+    AsyncElasticsearch = None  # type: ignore
+
+try:
+    import aiohttp  # type: ignore  # noqa: F401
+    _ASYNC_NODE_CLASS = "aiohttp"
+except Exception:
+    # elastic-transport ships an httpx-based async node; httpx is already a dependency
+    _ASYNC_NODE_CLASS = "httpxasync"
+
 
 class ESQLQuery(BaseModel):
     query: str = Field(...)
@@ -28,30 +49,70 @@ class ESQLResponse(BaseModel):
     rows: List[List[Any]] = Field(...)
 
 
+class ColumnBatch:
+    """One page of results, transposed to columns (no per-row dicts)."""
+
+    __slots__ = ("names", "columns", "size")
+
+    def __init__(self, names: Sequence[str], rows: Sequence[Sequence[Any]]) -> None:
+        self.names = list(names)
+        self.size = len(rows)
+        cols = list(zip(*rows)) if rows else [() for _ in self.names]
+        self.columns: Dict[str, Sequence[Any]] = dict(zip(self.names, cols))
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Sequence[Any]], size: int) -> "ColumnBatch":
+        batch = cls.__new__(cls)
+        batch.names = list(columns)
+        batch.columns = dict(columns)
+        batch.size = size
+        return batch
+
+    def __len__(self) -> int:
+        return self.size
+
+    def select(self, indices: Sequence[int], names: Optional[Sequence[str]] = None) -> "ColumnBatch":
+        """Subset of rows (and optionally columns), without building row dicts."""
+        keep = self.names if names is None else names
+        return ColumnBatch.from_columns({n: [self.columns[n][i] for i in indices] for n in keep}, len(indices))
+
+    def column(self, name: str, default: Any = None) -> Sequence[Any]:
+        col = self.columns.get(name)
+        return col if col is not None else [default] * self.size
+
+    def row(self, i: int) -> Dict[str, Any]:
+        return {name: col[i] for name, col in self.columns.items()}
+
+
 # Load environment configuration
 _ELASTIC_HOST: str = get_env("ELASTIC_HOST", "http://localhost:9200")
 _ELASTIC_USER: Optional[str] = get_env("ELASTIC_USER")
 _ELASTIC_PASSWORD: Optional[str] = get_env("ELASTIC_PASSWORD")
 _ELASTIC_CA_CERTS: Optional[str] = get_env("ELASTIC_CA_CERTS")
+_ELASTIC_POOL_SIZE: int = int(get_env("ELASTIC_POOL_SIZE", "10") or 10)
 
-es_client: Optional[Elasticsearch] = None
-if Elasticsearch is not None:
-    try:
-        kwargs: Dict[str, Any] = {}
 
-        # Add auth only if provided
-        if _ELASTIC_USER and _ELASTIC_PASSWORD:
-            kwargs["basic_auth"] = (_ELASTIC_USER, _ELASTIC_PASSWORD)
+def _client_kwargs() -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {}
 
-        # Add CA certs only if provided
-        if _ELASTIC_CA_CERTS:
-            kwargs["ca_certs"] = _ELASTIC_CA_CERTS
-            kwargs["verify_certs"] = True
-        else:
-            # If host is https:// but no CA certs provided, disable verify
-            kwargs["verify_certs"] = False
+    # Add auth only if provided
+    if _ELASTIC_USER and _ELASTIC_PASSWORD:
+        kwargs["basic_auth"] = (_ELASTIC_USER, _ELASTIC_PASSWORD)
 
-        es_client = Elasticsearch([_ELASTIC_HOST], **kwargs)
+    # Add CA certs only if provided
+    if _ELASTIC_CA_CERTS:
+        kwargs["ca_certs"] = _ELASTIC_CA_CERTS
+        kwargs["verify_certs"] = True
+    else:
+        # If host is https:// but no CA certs provided, disable verify
+        kwargs["verify_certs"] = False
+    return kwargs
+
+
+es_client: Optional[Elasticsearch] = None
+if Elasticsearch is not None:
+    try:
+        es_client = Elasticsearch([_ELASTIC_HOST], **_client_kwargs())
 
         # Sanity check connection (will raise if unreachable)
         info = es_client.info()
@@ -81,3 +142,81 @@ def run_query(payload: ESQLQuery) -> ESQLResponse:
     except (ValidationError, Exception) as exc:
         logger.exception("ESQL query failed: %s", exc)
         raise
+
+
+# AsyncElasticsearch binds its connection pool to the loop it first runs on,
+# so keep one pooled client per event loop (dropped with the loop).
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+
+
+def get_async_client() -> Any:
+    if AsyncElasticsearch is None:
+        raise RuntimeError("AsyncElasticsearch is not available")
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncElasticsearch(
+            [_ELASTIC_HOST],
+            node_class=_ASYNC_NODE_CLASS,
+            connections_per_node=_ELASTIC_POOL_SIZE,
+            **_client_kwargs(),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def close_async_client() -> None:
+    """Close the pooled client of the running loop (e.g. on application shutdown)."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+async def iter_query_pages(
+    payload: ESQLQuery,
+    fetch_size: int = 500,
+    timeout: Optional[float] = None,
+) -> AsyncIterator[ColumnBatch]:
+    """
+    Stream a query page by page through the SQL cursor.
+
+    `timeout` is a deadline for the whole query, shared by every page. The
+    cursor is cleared if the consumer stops early or the deadline expires.
+    """
+    client = get_async_client()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout if timeout else None
+
+    async def _call(body: Dict[str, Any]) -> Dict[str, Any]:
+        remaining = None
+        if deadline is not None:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+        c = client.options(request_timeout=remaining) if remaining else client
+        raw = await asyncio.wait_for(c.sql.query(body=body), remaining)
+        return raw.body if hasattr(raw, "body") else raw
+
+    logger.info("Running ESQL query (paged, fetch_size=%d): %s", fetch_size, payload.query)
+    page = await _call({"query": payload.query, "fetch_size": fetch_size})
+    names = [c["name"] for c in page.get("columns", [])]
+    cursor = page.get("cursor")
+    pages = rows = 0
+    try:
+        while True:
+            batch = ColumnBatch(names, page.get("rows", []))
+            pages += 1
+            rows += len(batch)
+            if len(batch):
+                yield batch
+            if not cursor:
+                break
+            page = await _call({"cursor": cursor})
+            cursor = page.get("cursor")
+    finally:
+        if cursor:
+            try:
+                await client.sql.clear_cursor(body={"cursor": cursor})
+            except Exception as exc:
+                logger.debug("Failed to clear SQL cursor: %s", exc)
+        logger.info("ESQL query streamed %d rows in %d pages", rows, pages)